@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+"""
+Micro-benchmarks for rpc_proxy hot paths, ran against the example API with
+mocked requests like the unit tests.
+
+    python benchmarks.py settings.test_proxy
+"""
+import hashlib
+import json
+import os
+import sys
+import timeit
+
+
+APP_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '../'))
+DJANGO_SETTINGS_MODULE = sys.argv[1] if len(sys.argv) > 1 else 'settings.test_proxy'
+NUMBER = 1000
+
+sys.path.insert(0, APP_ROOT)
+os.environ['DJANGO_SETTINGS_MODULE'] = os.environ.get('DJANGO_SETTINGS_MODULE',
+                                                      DJANGO_SETTINGS_MODULE)
+
+
+def setup():
+    from django.core.cache import cache
+    from django.db import connection
+    from django.test.utils import setup_test_environment
+    from mock import patch
+
+    from rpc_proxy.test import mock_cache_set, mock_request
+
+    setup_test_environment()
+    connection.creation.create_test_db(verbosity=0)
+    cache.clear()
+
+    patch('requests.sessions.Session.request', mock_request).start()
+    patch('tastypie.cache.SimpleCache.set', mock_cache_set).start()
+
+def report(name, func, number=NUMBER):
+    elapsed = min(timeit.repeat(func, number=number, repeat=3))
+    print '%-50s %10.2f usec/call' % (name, elapsed / number * 1000000,)
+
+def bench_related_access():
+    from example.proxies import Track
+    from rpc_proxy.proxies import ProxyClient
+
+    track = Track.objects.all()[0]
+
+    def uncached():
+        ProxyClient._relations.clear()
+        track._related_model('item')
+
+    def cached():
+        track._related_model('item')
+
+    def attribute():
+        # a fresh placeholder each time
+        track._related_objects.clear()
+        track.item
+
+    report('related model resolution (uncached)', uncached)
+    report('related model resolution (cached)', cached)
+    report('to_one attribute access', attribute)
+
+def bench_codecs():
+    from example import models
+    from example.proxies import Item, Track
+    from rpc_proxy.cache import FORMATS, Codec
+
+    def payload(response):
+        response = dict(response._response)
+        response.pop('model', None)
+        return response
+
+    # a page of distinct objects, repeated ones would flatter zlib
+    for i in range(20):
+        models.Item.objects.get_or_create(source_item_id='b-%d-%s@some.service' % (
+                                              i, hashlib.md5(str(i)).hexdigest(),),
+                                          defaults={'item_type': 0, 'meta_type': i % 2})
+
+    detail = payload(Track.objects.all()[0])
+    # decoded like responses, without objects shared in the page
+    page = json.loads(json.dumps({
+        'meta': {'limit': 20, 'next': None, 'offset': 0, 'previous': None, 'total_count': 20},
+        'objects': [payload(item) for item in Item.objects.filter(source_item_id__startswith='b-')],
+    }))
+
+    for name, value in (('detail', detail,), ('list', page,),):
+        for format in sorted(FORMATS):
+            for threshold in (None, 256,):
+                codec = Codec(format, threshold)
+                data = codec.dumps(value)
+                label = '%s %s%s' % (name, format, ' + zlib' if threshold is not None else '',)
+
+                report('%s encode' % label, lambda: codec.dumps(value))
+                report('%s decode (%d bytes)' % (label, len(data),), lambda: codec.loads(data))
+
+
+BENCHMARKS = (
+    bench_related_access,
+    bench_codecs,
+)
+
+if __name__ == '__main__':
+    setup()
+    for benchmark in BENCHMARKS:
+        benchmark()
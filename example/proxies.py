@@ -73,6 +73,7 @@ class Item(proxies.Proxy):
 
     class Meta:
 
+        batch_loading = True
         namespace = 'core'
 
     @property
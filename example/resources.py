@@ -13,6 +13,7 @@ from tastypie.throttle import CacheThrottle
 
 from example import models
 from rpc_proxy import resources
+from rpc_proxy.paginator import CursorPaginator
 
 
 logger = logging.getLogger(__name__)
@@ -48,6 +49,7 @@ class Item(resources.ModelResource):
 
         queryset = models.Item.objects.all()
         resource_name = 'item'
+        paginator_class = CursorPaginator
         filtering = {
             'children': ALL_WITH_RELATIONS,
             'parents' : ALL_WITH_RELATIONS,
@@ -4,3 +4,4 @@ from .test import *
 
 # rpc_proxy
 TASTYPIE_RPC_PROXY['API_URL'] = '/api'
+TASTYPIE_RPC_PROXY['LOCAL_CACHE_SIZE'] = 1000
@@ -1,3 +1,6 @@
 # -*- coding: utf-8 -*-
+from .cache import *
+from .middleware import *
 from .proxies import *
 from .resources import *
+from .utils import *
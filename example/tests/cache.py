@@ -0,0 +1,251 @@
+# -*- coding: utf-8 -*-
+import logging
+import threading
+import time
+
+from mock import patch
+from rpc_proxy.cache import (FORMATS, Codec, LocalCache, SingleFlight, TieredCache, read_entry,
+                             stale_entry)
+from rpc_proxy.test import TestCase
+
+
+logger = logging.getLogger(__name__)
+
+
+class LocalCacheTest(TestCase):
+
+    def test_get(self):
+        cache = LocalCache(max_entries=10, timeout=60)
+        cache.set('a', {'id': 1})
+
+        self.assertEqual(cache.get('a'), {'id': 1})
+        self.assertEqual(cache.get('b'), None)
+        self.assertEqual(cache.stats()['hits'], 1)
+        self.assertEqual(cache.stats()['misses'], 1)
+
+        # cached values can't be mutated
+        cache.get('a')['id'] = 2
+        self.assertEqual(cache.get('a'), {'id': 1})
+
+    def test_timeout(self):
+        cache = LocalCache(max_entries=10, timeout=60)
+        cache.set('a', 'value', timeout=0.01)
+
+        time.sleep(0.02)
+
+        self.assertEqual(cache.get('a'), None)
+
+    def test_eviction(self):
+        cache = LocalCache(max_entries=2, timeout=60)
+        cache.set('a', 'a')
+        cache.set('b', 'b')
+        cache.get('a')
+        cache.set('c', 'c')
+
+        # least recently used goes first
+        self.assertEqual(cache.get('b'), None)
+        self.assertEqual(cache.get('a'), 'a')
+        self.assertEqual(cache.get('c'), 'c')
+        self.assertEqual(len(cache), 2)
+
+
+class TieredCacheTest(TestCase):
+
+    def test_tiers(self):
+        backend = LocalCache(max_entries=10, timeout=60)
+        cache = TieredCache(backend, LocalCache(max_entries=10, timeout=60))
+
+        cache.set('a', 'a')
+        self.assertEqual(backend.get('a'), 'a')
+
+        backend.set('b', 'b')
+        self.assertEqual(cache.get_many(['a', 'b', 'c']), {'a': 'a', 'b': 'b'})
+
+        # served locally
+        backend.delete('b')
+        self.assertEqual(cache.get('b'), 'b')
+
+        cache.delete('a')
+        self.assertEqual(cache.get('a'), None)
+        self.assertEqual(backend.get('a'), None)
+
+    def test_timeout(self):
+        backend = LocalCache(max_entries=10, timeout=60)
+        cache = TieredCache(backend, LocalCache(max_entries=10, timeout=60), timeout=0.01)
+
+        cache.set('a', 'a')
+
+        time.sleep(0.02)
+
+        # neither tier outlives the timeout
+        self.assertEqual(backend.get('a'), None)
+        self.assertEqual(cache.get('a'), None)
+
+
+class StaleEntryTest(TestCase):
+
+    def test_entry(self):
+        entry = stale_entry({'id': 1}, 0.01)
+        self.assertEqual(read_entry(entry), ({'id': 1}, False,))
+
+        time.sleep(0.02)
+
+        self.assertEqual(read_entry(entry), ({'id': 1}, True,))
+        self.assertEqual(read_entry('value'), ('value', False,))
+
+    def test_early_refresh(self):
+        entry = stale_entry('value', 60, delta=60)
+
+        self.assertEqual(read_entry(entry), ('value', False,))
+
+        with patch('random.random', lambda: 0.5):
+            self.assertEqual(read_entry(entry, beta=0.1), ('value', False,))
+            self.assertEqual(read_entry(entry, beta=10), ('value', True,))
+        self.assertEqual(read_entry(None), (None, False,))
+
+
+class SingleFlightTest(TestCase):
+
+    def test_do(self):
+        flights = SingleFlight()
+        started = threading.Event()
+        results = []
+
+        def fetch():
+            started.set()
+            time.sleep(0.05)
+            return {'id': 1}
+
+        def call():
+            results.append(flights.do('a', fetch))
+
+        leader = threading.Thread(target=call)
+        leader.start()
+        started.wait()
+
+        followers = [threading.Thread(target=call) for i in range(3)]
+        for thread in followers:
+            thread.start()
+        for thread in [leader] + followers:
+            thread.join()
+
+        self.assertEqual(results, [{'id': 1}] * 4)
+        self.assertEqual(flights.stats(), {'calls': 1, 'coalesced': 3})
+
+        # results are copied
+        results[0]['id'] = 2
+        self.assertEqual(len([result for result in results if result['id'] == 1]), 3)
+
+    def test_mutate(self):
+        flights = SingleFlight()
+        errors = []
+        results = []
+
+        def fetch():
+            time.sleep(0.01)
+            return {'id': 1, 'objects': [{'id': i} for i in range(100)]}
+
+        def call():
+            try:
+                result = flights.do('a', fetch)
+
+                # callers write into their results like Response.refresh
+                for i in range(100):
+                    result['model_%d' % i] = object
+                    result['objects'].append({'id': i})
+
+                results.append(result)
+            except Exception, e:
+                errors.append(e)
+
+        for i in range(20):
+            threads = [threading.Thread(target=call) for j in range(20)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+        self.assertEqual(errors, [])
+        self.assertEqual(len(results), 400)
+        self.assertTrue(all([len(result['objects']) == 200 for result in results]))
+
+    def test_error(self):
+        flights = SingleFlight()
+
+        def fail():
+            raise ValueError('failed')
+
+        self.assertRaises(ValueError, flights.do, 'a', fail)
+        self.assertEqual(flights.do('a', lambda: 1), 1)
+        self.assertEqual(flights.stats(), {'calls': 2, 'coalesced': 0})
+
+
+    def test_interrupt(self):
+        flights = SingleFlight()
+        started = threading.Event()
+        errors = []
+
+        class Interrupt(BaseException):
+            pass
+
+        def interrupt():
+            started.set()
+            time.sleep(0.05)
+            raise Interrupt()
+
+        def call():
+            try:
+                flights.do('a', interrupt)
+            except Interrupt, e:
+                errors.append(e)
+
+        leader = threading.Thread(target=call)
+        leader.start()
+        started.wait()
+
+        follower = threading.Thread(target=call)
+        follower.start()
+        for thread in (leader, follower,):
+            thread.join()
+
+        # waiters don't take the missing result for a successful one
+        self.assertEqual(len(errors), 2)
+
+    def test_no_waiters(self):
+        flights = SingleFlight()
+
+        with patch('copy.deepcopy') as deepcopy:
+            self.assertEqual(flights.do('a', lambda: {'id': 1}), {'id': 1})
+
+        self.assertFalse(deepcopy.called)
+
+
+class CodecTest(TestCase):
+
+    def test_formats(self):
+        value = {'id': 1, 'title': u'ポップ・ソング集', 'tracks': ['/api/v1/core/track/1/'], 'meta': None}
+
+        for format in FORMATS:
+            codec = Codec(format)
+            self.assertEqual(codec.loads(codec.dumps(value)), value)
+
+            # decoded regardless of the format
+            self.assertEqual(Codec('json').loads(codec.dumps(value)), value)
+
+        self.assertRaises(ValueError, Codec, 'unknown')
+
+    def test_compress(self):
+        value = {'objects': [{'id': i, 'title': 'title'} for i in range(100)]}
+        codec = Codec('pickle', compress_threshold=256)
+
+        self.assertTrue(len(codec.dumps(value)) < len(Codec('pickle').dumps(value)))
+        self.assertEqual(codec.loads(codec.dumps(value)), value)
+
+        # small values are left uncompressed
+        self.assertEqual(codec.dumps({'id': 1}), Codec('pickle').dumps({'id': 1}))
+
+    def test_legacy(self):
+        codec = Codec('pickle')
+
+        self.assertEqual(codec.loads('{"id": 1}'), {'id': 1})
+        self.assertEqual(codec.loads({'id': 1}), {'id': 1})
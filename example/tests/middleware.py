@@ -0,0 +1,26 @@
+# -*- coding: utf-8 -*-
+import logging
+
+from django.http import HttpResponse
+from django.test.client import RequestFactory
+
+from rpc_proxy.middleware import IdentityMapMiddleware
+from rpc_proxy.proxies import get_identity_map
+from rpc_proxy.test import TestCase
+
+
+logger = logging.getLogger(__name__)
+
+
+class IdentityMapMiddlewareTest(TestCase):
+
+    def test_request(self):
+        middleware = IdentityMapMiddleware()
+        request = RequestFactory().get('/')
+
+        middleware.process_request(request)
+        self.assertEqual(get_identity_map(), {})
+
+        response = middleware.process_response(request, HttpResponse())
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(get_identity_map(), None)
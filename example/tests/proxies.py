@@ -1,19 +1,32 @@
 # -*- coding: utf-8 -*-
 import logging
+import requests
+import time
 
 from datetime import datetime
 from django.conf import settings
 from django.core.exceptions import ObjectDoesNotExist
+from mock import patch
 from queryset_client import client
 
 from rpc_proxy import exceptions, test
-from rpc_proxy.proxies import get_setting
+from rpc_proxy.cache import acquire_lock, release_lock
+from rpc_proxy.paginator import CursorPaginator
+from rpc_proxy.proxies import ProxyOptions, QuerySet, cache, get_pk, get_setting, identity_map
 
 
 logger = logging.getLogger(__name__)
 
 
-class ItemProxy(test.Proxy):
+class Proxy(test.Proxy):
+
+    def setUp(self):
+        # the example has its cache backend to itself
+        cache.clear()
+        super(Proxy, self).setUp()
+
+
+class ItemProxy(Proxy):
 
     def test_get(self):
         from example.proxies import Item
@@ -23,12 +36,410 @@ class ItemProxy(test.Proxy):
         self.assertRaises((client.ObjectDoesNotExist, ObjectDoesNotExist),
                           lambda: Item.objects.get(source_item_id='a-999@some.service'))
 
+    def test_get_by_pk(self):
+        from example.proxies import Item
+
+        for pk in (2, 2L, '2', u'2',):
+            self.assertEqual(Item.objects.get(id=pk).source_item_id, 't-1@some.service')
+            self.assertEqual(Item.objects.get(pk=pk).source_item_id, 't-1@some.service')
+
+        self.assertRaises((client.ObjectDoesNotExist, ObjectDoesNotExist),
+                          Item.objects.get,
+                          id=u'999')
+
     def test_filter(self):
         from example.proxies import Item
 
         self.assertEqual(Item.objects.filter(source_item_id__startswith='t-').count(),
                          3)
 
+    def test_cache_policy(self):
+        from example.proxies import Item
+
+        item = Item.objects.get(source_item_id='t-1@some.service')
+
+        with patch.object(ProxyOptions, 'cache', False):
+            with self.assertNumRequests(2):
+                self.assertEqual(Item.objects.get(pk=item.id).source_item_id,
+                                 't-1@some.service')
+                self.assertEqual(Item.objects.get(pk=item.id).source_item_id,
+                                 't-1@some.service')
+
+        with self.assertNumRequests(0):
+            self.assertEqual(Item.objects.get(pk=item.id).source_item_id,
+                             't-1@some.service')
+
+    def test_schema_cache_policy(self):
+        from example.proxies import Item
+        from rpc_proxy import proxies
+
+        alias = 'django.core.cache.backends.locmem.LocMemCache'
+
+        with patch.object(ProxyOptions, 'schema_cache_alias', alias):
+            with patch.object(ProxyOptions, 'schema_cache_timeout', 3600):
+                schema_cache = proxies.get_proxy_cache(ProxyOptions, True)
+                self.assertEqual(schema_cache.timeout, 3600)
+                self.assertFalse(schema_cache.backend is proxies.get_proxy_cache(ProxyOptions).backend)
+
+                if not get_setting('API_URL', None):
+                    return
+
+                base_client = Item._base_client
+
+                # the namespace schema follows the schema policy too
+                with patch.object(proxies, 'get_proxy_cache', wraps=proxies.get_proxy_cache) as get_proxy_cache:
+                    base_client.request(base_client._base_url)
+                    base_client.request('item/schema/')
+                    base_client.request('item/')
+
+                self.assertEqual([call[0][1] for call in get_proxy_cache.call_args_list],
+                                 [True, True, False])
+
+    def test_stale_cache(self):
+        from example.proxies import Item
+
+        item_id = Item.objects.get(source_item_id='t-1@some.service').id
+
+        if not get_setting('API_URL', None):
+            return
+
+        with patch.multiple(ProxyOptions,
+                            stale_timeout=0.01,
+                            stale_while_revalidate=True,
+                            stale_if_error=True):
+            cache.clear()
+            Item.objects.get(pk=item_id)
+
+            time.sleep(0.02)
+
+            # stale served and revalidated
+            with patch('rpc_proxy.proxies.revalidate', lambda key, func, *args: func(*args)):
+                with self.assertNumRequests(1):
+                    self.assertEqual(Item.objects.get(pk=item_id).source_item_id,
+                                     't-1@some.service')
+
+            with self.assertNumRequests(0):
+                Item.objects.get(pk=item_id)
+
+            time.sleep(0.02)
+
+            # stale served on upstream errors
+            with patch.object(ProxyOptions, 'stale_while_revalidate', False):
+                with patch('requests.sessions.Session.request',
+                           side_effect=requests.exceptions.ConnectionError):
+                    self.assertEqual(Item.objects.get(pk=item_id).source_item_id,
+                                     't-1@some.service')
+
+                with patch.object(ProxyOptions, 'stale_if_error', False):
+                    with patch('requests.sessions.Session.request',
+                               side_effect=requests.exceptions.ConnectionError):
+                        self.assertRaises(requests.exceptions.ConnectionError,
+                                          Item.objects.get, pk=item_id)
+
+    def test_stampede_lock(self):
+        from example.proxies import Item
+
+        item = Item.objects.get(source_item_id='t-1@some.service')
+
+        if not get_setting('API_URL', None):
+            return
+
+        with patch.multiple(ProxyOptions,
+                            stale_timeout=0.01,
+                            stampede_lock=True,
+                            stampede_lock_timeout=0.1):
+            cache.clear()
+            Item.objects.get(pk=item.id)
+
+            time.sleep(0.02)
+
+            # stale served while another process is fetching
+            acquire_lock(cache, item.resource_uri, 1)
+            with self.assertNumRequests(0):
+                self.assertEqual(Item.objects.get(pk=item.id).source_item_id,
+                                 't-1@some.service')
+            release_lock(cache, item.resource_uri)
+
+            with self.assertNumRequests(1):
+                Item.objects.get(pk=item.id)
+
+            # fetched after waiting for the lock to expire
+            cache.delete(item.resource_uri)
+            acquire_lock(cache, item.resource_uri, 0.1)
+            with self.assertNumRequests(1):
+                self.assertEqual(Item.objects.get(pk=item.id).source_item_id,
+                                 't-1@some.service')
+
+    def test_not_found_cache(self):
+        from example.proxies import Item
+
+        with patch.object(ProxyOptions, 'not_found_timeout', 60):
+            self.assertRaises((client.ObjectDoesNotExist, ObjectDoesNotExist),
+                              Item.objects.get,
+                              source_item_id='t-999@some.service')
+
+            with self.assertNumRequests(0):
+                self.assertRaises((client.ObjectDoesNotExist, ObjectDoesNotExist),
+                                  Item.objects.get,
+                                  source_item_id='t-999@some.service')
+
+            # created objects show up immediately
+            Item.objects.create(source_item_id='t-999@some.service',
+                                item_type=0,
+                                meta_type=0)
+            self.assertEqual(Item.objects.get(source_item_id='t-999@some.service').source_item_id,
+                             't-999@some.service')
+
+    def test_unique_lookup(self):
+        from example.proxies import Item
+
+        item = Item.objects.get(source_item_id='t-1@some.service')
+
+        with self.assertNumRequests(0):
+            self.assertEqual(Item.objects.get(source_item_id='t-1@some.service').id,
+                             item.id)
+            self.assertEqual(Item.objects.get(source_item_id__exact='t-1@some.service').id,
+                             item.id)
+
+        item.source_item_id = 't-100@some.service'
+        item.save()
+
+        # saved values are indexed
+        with self.assertNumRequests(1):
+            self.assertEqual(Item.objects.get(source_item_id='t-100@some.service').id,
+                             item.id)
+
+        # out of date entries are ignored
+        self.assertRaises((client.ObjectDoesNotExist, ObjectDoesNotExist),
+                          Item.objects.get,
+                          source_item_id='t-1@some.service')
+
+    def test_query_cache(self):
+        from example.proxies import Item
+
+        with patch.object(ProxyOptions, 'cache_queries', True):
+            self.assertEqual(len(Item.objects.filter(source_item_id__startswith='t-')),
+                             3)
+
+            # hydrated from cache
+            with self.assertNumRequests(0):
+                items = Item.objects.filter(source_item_id__startswith='t-')
+                self.assertEqual(sorted([item.source_item_id for item in items]),
+                                 ['t-1@some.service', 't-2@some.service', 't-3@some.service'])
+
+            # writes invalidate cached queries of the resource
+            item = Item.objects.create(source_item_id='t-999@some.service',
+                                       item_type=0,
+                                       meta_type=0)
+            self.assertEqual(Item.objects.filter(source_item_id__startswith='t-').count(),
+                             4)
+
+            item.delete()
+            self.assertEqual(Item.objects.filter(source_item_id__startswith='t-').count(),
+                             3)
+
+    def test_query_cache_list_objects(self):
+        from example.proxies import Item
+
+        with patch.multiple(ProxyOptions, cache_queries=True, cache_list_objects=False):
+            items = list(Item.objects.filter(source_item_id__startswith='t-'))
+
+            # neither the query nor the list representations are cached
+            with self.assertNumRequests(2):
+                self.assertEqual(len(list(Item.objects.filter(source_item_id__startswith='t-'))), 3)
+                self.assertEqual(Item.objects.get(pk=items[0].pk).pk, items[0].pk)
+
+    def test_generation(self):
+        from django.core.cache import get_cache
+        from rpc_proxy.cache import LocalCache, TieredCache
+        from rpc_proxy.proxies import GENERATION_TIMEOUT, bump_generation, get_generation
+
+        endpoint = '/api/v1/generation/'
+        backend = TieredCache(get_cache('django.core.cache.backends.locmem.LocMemCache'),
+                              LocalCache(10, 60),
+                              timeout=1)
+
+        with patch('rpc_proxy.proxies.time') as clock:
+            clock.time.return_value = 1000.0
+            with patch.object(backend.backend, 'add', wraps=backend.backend.add) as add:
+                generation = get_generation(endpoint, backend)
+
+        # kept longer than cached lists instead of the cache timeout
+        self.assertEqual(add.call_args[0][2], GENERATION_TIMEOUT)
+        self.assertEqual(bump_generation(endpoint, backend), generation + 1)
+        self.assertEqual(bump_generation(endpoint, backend), generation + 2)
+
+        # bumps in other processes are seen at once
+        backend.backend.incr('rpc_proxy:generation:%s' % endpoint)
+        self.assertEqual(get_generation(endpoint, backend), generation + 3)
+
+        # restarts above the bumped generations once expired
+        backend.delete('rpc_proxy:generation:%s' % endpoint)
+
+        with patch('rpc_proxy.proxies.time') as clock:
+            clock.time.return_value = 1000.1
+            self.assertTrue(get_generation(endpoint, backend) > generation + 3)
+
+    def test_iterator(self):
+        from example.proxies import Item
+
+        if not get_setting('API_URL', None):
+            return
+
+        class Thread(object):
+            # background fetches run against the test database in-line
+
+            def __init__(self, target):
+                self.target = target
+
+            def start(self):
+                self.target()
+
+        with patch('threading.Thread', Thread):
+            with self.assertNumRequests(3) as context:
+                items = Item.objects.iterator(chunk_size=2)
+
+                # the next page is fetched ahead
+                items.next()
+                self.assertEqual(len(context.requests), 2)
+
+                self.assertEqual(len(list(items)), 4)
+
+        # evaluated pages are yielded once
+        from example import resources
+
+        with patch.object(resources.Item._meta, 'limit', 2):
+            items = Item.objects.all()
+            ids = [item.id for item in items]
+            self.assertEqual(len(ids), 5)
+
+            with self.assertNumRequests(0):
+                self.assertEqual([item.id for item in items.iterator()], ids)
+
+        # yielded objects are not kept in the identity map
+        with patch('threading.Thread', Thread):
+            with identity_map() as identities:
+                self.assertEqual(len(list(Item.objects.iterator(chunk_size=2))), 5)
+                self.assertEqual(identities, {})
+
+    def test_slicing(self):
+        from example.proxies import Item
+
+        ids = sorted([item.id for item in Item.objects.all()])
+
+        # slices, indexes, latest() and exists() are a request each
+        with self.assertNumRequests(1):
+            items = Item.objects.order_by('id')[1:3]
+            self.assertEqual([item.id for item in items], ids[1:3])
+            self.assertEqual(len(items), 2)
+
+        with self.assertNumRequests(1):
+            self.assertEqual(Item.objects.order_by('id')[3].id, ids[3])
+
+        with self.assertNumRequests(1):
+            self.assertEqual(Item.objects.order_by('id')[1:][2:3][0].id, ids[3])
+
+        with self.assertNumRequests(1):
+            self.assertEqual(Item.objects.latest('id').id, ids[-1])
+
+        with self.assertNumRequests(1):
+            self.assertTrue(Item.objects.filter(source_item_id__startswith='t-').exists())
+
+        with self.assertNumRequests(1):
+            self.assertRaises(IndexError, lambda: Item.objects.order_by('-id')[len(ids)])
+
+        with self.assertNumRequests(0):
+            self.assertEqual(list(Item.objects.all()[2:2]), [])
+
+        # evaluated query sets are sliced in memory
+        items = Item.objects.order_by('id')
+        list(items)
+
+        with self.assertNumRequests(0):
+            self.assertEqual(items[1].id, ids[1])
+            self.assertEqual([item.id for item in items[1:3]], ids[1:3])
+            self.assertRaises(IndexError, lambda: items[len(ids)])
+
+            # open-ended as well, as long as no page is left
+            self.assertEqual([item.id for item in items[1:]], ids[1:])
+            self.assertEqual(items[1:][1].id, ids[2])
+
+        if not get_setting('API_URL', None):
+            return
+
+        # and stay query sets
+        with self.assertNumRequests(0):
+            self.assertEqual(items[1:].count(), len(ids) - 1)
+            self.assertFalse(items[len(ids):].exists())
+
+    def test_count(self):
+        from example.proxies import Item
+
+        with self.assertNumRequests(1):
+            self.assertEqual(Item.objects.filter(source_item_id__startswith='t-').count(), 3)
+
+        with self.assertNumRequests(1):
+            self.assertEqual(Item.objects.all()[1:3].count(), 2)
+
+        if not get_setting('API_URL', None):
+            return
+
+        # a single object is requested to read total_count
+        get_responses = QuerySet._get_responses
+        with patch.object(QuerySet, '_get_responses', autospec=True,
+                          side_effect=get_responses) as mock_get_responses:
+            self.assertEqual(Item.objects.count(), 5)
+            self.assertEqual(mock_get_responses.call_args[1]['limit'], 1)
+
+        with patch.object(ProxyOptions, 'cache_queries', True):
+            self.assertEqual(Item.objects.filter(source_item_id__startswith='t-').count(), 3)
+
+            # cached counts answer count() and exists()
+            with self.assertNumRequests(0):
+                self.assertEqual(Item.objects.filter(source_item_id__startswith='t-').count(), 3)
+                self.assertTrue(Item.objects.filter(source_item_id__startswith='t-').exists())
+
+            item = Item.objects.create(source_item_id='t-999@some.service',
+                                       item_type=0,
+                                       meta_type=0)
+            self.assertEqual(Item.objects.filter(source_item_id__startswith='t-').count(), 4)
+
+            item.delete()
+            self.assertEqual(Item.objects.filter(source_item_id__startswith='t-').count(), 3)
+
+        # resources may skip counting, pages are followed to the end
+        from example import resources
+
+        with patch.object(CursorPaginator, 'total_count', None):
+            with patch.object(resources.Item._meta, 'limit', 2):
+                self.assertEqual(Item.objects.count(), 5)
+                self.assertEqual(len(Item.objects.all()[1:]), 4)
+                self.assertEqual(len(list(Item.objects.all())), 5)
+
+    def test_lazy_filters(self):
+        from example.proxies import Item
+
+        item = Item.objects.get(source_item_id='a-1@some.service')
+
+        # chained filters are merged into a request on evaluation
+        with self.assertNumRequests(1):
+            items = Item.objects.filter(source_item_id__startswith='t-')
+            items = items.filter(parents__source_item_id='a-1@some.service')
+            self.assertEqual(len(items), 3)
+            self.assertEqual(items[0].source_item_id, 't-1@some.service')
+
+        with self.assertNumRequests(0):
+            children = item.children.all()
+            children = item.children.filter(source_item_id__startswith='t-')
+
+        with self.assertNumRequests(1):
+            children = children.filter(source_item_id='t-2@some.service')
+            self.assertEqual([child.source_item_id for child in children],
+                             ['t-2@some.service'])
+
+        with self.assertNumRequests(1):
+            self.assertEqual(item.children.count(), 3)
+
     def test_save(self):
         from example.proxies import Item
 
@@ -154,6 +565,22 @@ class ItemProxy(test.Proxy):
 
         self.assertEqual(parent.children.count(), 0)
 
+    def test_prefetch_related(self):
+        from example.proxies import Item
+
+        # a list request and a children request in bulk
+        with self.assertNumRequests(2):
+            items = list(Item.objects.prefetch_related('children').filter(source_item_id__startswith='a-'))
+
+        with self.assertNumRequests(0):
+            self.assertEqual([item.children.count() for item in items], [3, 0])
+            self.assertEqual(items[0].children.filter(source_item_id__startswith='t-1').count(), 1)
+            self.assertEqual(items[0].children.all()[0].meta_type_display, 'Track')
+
+        # children are served from cache in a single round trip
+        self.assertNumRequests(1,
+                               lambda: [item.children.count() for item in Item.objects.prefetch_related('children').all()])
+
     def test_item_type_display(self):
         from example.proxies import Item
 
@@ -180,7 +607,7 @@ class ItemProxy(test.Proxy):
                          'Track')
 
 
-class AlbumProxy(test.Proxy):
+class AlbumProxy(Proxy):
 
     def test_get(self):
         from example.proxies import Album
@@ -230,7 +657,10 @@ class AlbumProxy(test.Proxy):
 
         a = Album.objects.get(item__source_item_id__startswith='a-1@some.service')
 
-        en = a.localize()
+        # a single list request of the album and the language
+        with self.assertNumRequests(1):
+            en = a.localize()
+
         self.assertEqual(en.language_code, 'en')
         self.assertEqual(en.title, 'A Pop Song Collection')
 
@@ -280,7 +710,7 @@ class AlbumProxy(test.Proxy):
         self.assertEqual(Track.objects.count(), 1)
         
 
-class TrackProxy(test.Proxy):
+class TrackProxy(Proxy):
 
     def test_get(self):
         from example.proxies import Track
@@ -366,6 +796,17 @@ class TrackProxy(test.Proxy):
 
         self.assertEqual(t.localizations.count(), 1)
 
+    def test_deferred_localize(self):
+        from example.proxies import Track, TrackLocalization
+
+        localization = TrackLocalization.objects.filter(language_code='ja')[0]
+        track = localization.track
+
+        self.assertEqual(track.localize('ja').title, localization.title)
+        self.assertEqual(track.localize().language_code, 'en')
+        self.assertEqual(track.length, Track.objects.get(pk=track.id).length)
+        self.assertTrue(track.release_date)
+
     def test_track_album_relation(self):
         from example.proxies import Album, Track
 
@@ -379,3 +820,164 @@ class TrackProxy(test.Proxy):
 
         self.assertEqual(t.item.parents.filter(source_item_id__startswith='a-1')[0].children.count(), 2)
         self.assertEqual(Track.objects.count(), 1)
+
+    def test_related_schema_error(self):
+        from example.proxies import Track
+        from rpc_proxy.proxies import ProxyClient
+
+        if not get_setting('API_URL', None):
+            return
+
+        track = Track.objects.all()[0]
+        key = (track.model._endpoint, 'item',)
+        request = ProxyClient.request
+        failed = []
+
+        def fail_once(client, url, method='GET'):
+            if url.endswith('/item/schema/') and not failed:
+                failed.append(url)
+                raise requests.exceptions.ConnectionError()
+            return request(client, url, method)
+
+        ProxyClient._relations.pop(key, None)
+        ProxyClient._schemas.pop('item', None)
+        cache.clear()
+
+        with patch.object(ProxyClient, 'request', fail_once):
+            # the model without schema is not memoized
+            model, related_type = track._related_model('item')
+            self.assertTrue(failed)
+            self.assertFalse(model._schema_store)
+            self.assertFalse(key in ProxyClient._relations)
+
+            model, related_type = track._related_model('item')
+            self.assertTrue('source_item_id' in model._schema_store['fields'])
+            self.assertTrue(ProxyClient._relations[key][0] is model)
+            self.assertEqual(related_type, 'to_one')
+
+    def test_batch_loading(self):
+        from example.proxies import Track
+
+        tracks = list(Track.objects.all())
+
+        # items are loaded in bulk on the first access
+        with self.assertNumRequests(1):
+            self.assertEqual(sorted([t.item.source_item_id for t in tracks]),
+                             ['t-1@some.service', 't-2@some.service'])
+
+        tracks = list(Track.objects.all())
+
+        # and from cache later on
+        with self.assertNumRequests(0):
+            self.assertEqual(sorted([t.item.source_item_id for t in tracks]),
+                             ['t-1@some.service', 't-2@some.service'])
+
+    def test_batch_loading_list_objects(self):
+        from example.proxies import Item, Track
+
+        with patch.object(ProxyOptions, 'cache_list_objects', False):
+            tracks = list(Track.objects.all())
+
+            with self.assertNumRequests(1):
+                self.assertEqual(sorted([t.item.source_item_id for t in tracks]),
+                                 ['t-1@some.service', 't-2@some.service'])
+
+            # list representations are not cached as details
+            with self.assertNumRequests(1):
+                self.assertEqual(Item.objects.get(pk=tracks[0].item.pk).source_item_id,
+                                 tracks[0].item.source_item_id)
+
+    def test_identity_map(self):
+        from example.proxies import Item, Track
+
+        with identity_map():
+            tracks = list(Track.objects.all())
+            item = tracks[0].item
+            item.source_item_id
+
+            # resolved to the loaded object
+            with self.assertNumRequests(0):
+                self.assertEqual(Item.objects.get(pk=item.id).source_item_id,
+                                 item.source_item_id)
+                self.assertEqual(Track.objects.get(pk=tracks[0].id).item.source_item_id,
+                                 item.source_item_id)
+
+                if get_setting('API_URL', None):
+                    self.assertTrue(Item.objects.get(pk=item.id) is item)
+                    self.assertTrue(Track.objects.get(pk=tracks[0].id) is tracks[0])
+
+        if get_setting('API_URL', None):
+            self.assertFalse(Item.objects.get(pk=item.id) is item)
+
+    def test_proxy_class(self):
+        from example.proxies import Track
+
+        tracks = list(Track.objects.all())
+
+        self.assertTrue(tracks[0].__class__ is tracks[1].__class__)
+        self.assertEqual(tracks[0].localize().language_code, 'en')
+
+        if get_setting('API_URL', None):
+            self.assertTrue(isinstance(tracks[0], Track.__class__))
+
+        # extend() applies the attributes on every call
+        from rpc_proxy.proxies import extend
+
+        class Base(object):
+            pass
+
+        class Extension(object):
+            pass
+
+        self.assertEqual(extend(Base(), Extension, {'name': 'a'}).name, 'a')
+        self.assertEqual(extend(Base(), Extension, {'name': 'b'}).name, 'b')
+        self.assertTrue(isinstance(extend(Base(), Extension), Extension))
+
+    def test_deferred_foreign_key(self):
+        from example.proxies import Track
+
+        tracks = list(Track.objects.all())
+
+        # no need to load items to know the ids
+        with self.assertNumRequests(0):
+            self.assertEqual(sorted([t.item.id for t in tracks]), [2, 3])
+            self.assertEqual(sorted([get_pk(t.item) for t in tracks]), [2, 3])
+
+        with self.assertNumRequests(1):
+            self.assertEqual(Track.objects.get(item=tracks[0].item).item.pk,
+                             tracks[0].item.pk)
+
+    def test_list_cache(self):
+        from example.proxies import Item, Track
+
+        list(Item.objects.all())
+        tracks = list(Track.objects.all())
+
+        # items in the list are cached
+        with self.assertNumRequests(0):
+            self.assertEqual(sorted([t.item.source_item_id for t in tracks]),
+                             ['t-1@some.service', 't-2@some.service'])
+            self.assertEqual(Item.objects.get(pk=tracks[0].item.pk).pk, tracks[0].item.pk)
+
+        self.assertRaises((client.ObjectDoesNotExist, ObjectDoesNotExist),
+                          lambda: Item.objects.get(id=999))
+
+    def test_select_related(self):
+        from example.proxies import Track
+
+        # a list request and an item request in bulk
+        with self.assertNumRequests(2):
+            tracks = list(Track.objects.select_related('item').filter(item__source_item_id__startswith='t-'))
+
+        with self.assertNumRequests(0):
+            self.assertEqual(sorted([t.item.source_item_id for t in tracks]),
+                             ['t-1@some.service', 't-2@some.service'])
+
+        # items are served from cache in a single round trip
+        self.assertNumRequests(1,
+                               lambda: [t.item.source_item_id for t in Track.objects.select_related('item').all()])
+
+        tracks = list(Track.objects.select_related('item__parents').all())
+
+        with self.assertNumRequests(0):
+            self.assertEqual([t.item.parents.count() for t in tracks], [1, 1])
@@ -1,10 +1,14 @@
 # -*- coding: utf-8 -*-
+import base64
+import json
 import logging
 
 from datetime import datetime
 from django.conf import settings
+from mock import patch
 from tastypie.test import ResourceTestCase
 
+from rpc_proxy.paginator import CursorPaginator, Paginator
 from rpc_proxy.test import TestCase
 
 from example.models import *
@@ -49,6 +53,105 @@ class ItemResource(TestCase, ResourceTestCase):
                                 format='json',
                                 authentication=self.get_credentials()))
 
+    def test_get_list_cursor(self):
+        ids = []
+        url = self.list_endpoint
+        data = {'limit': 2}
+
+        while url:
+            response = self.deserialize(
+                self.api_client.get(url,
+                                    format='json',
+                                    data=data,
+                                    authentication=self.get_credentials()))
+            self.assertEqual(response['meta']['total_count'], 5)
+            self.assertTrue(len(response['objects']) <= 2)
+
+            ids.extend([obj['id'] for obj in response['objects']])
+            url, data = response['meta']['next'], None
+
+        self.assertEqual(ids, list(Item.objects.order_by('pk').values_list('pk', flat=True)))
+
+        # offset paging on demand
+        response = self.deserialize(
+            self.api_client.get(self.list_endpoint,
+                                format='json',
+                                data={'limit': 2, 'offset': 2},
+                                authentication=self.get_credentials()))
+        self.assertEqual([obj['id'] for obj in response['objects']], ids[2:4])
+        self.assertEqual(response['meta']['offset'], 2)
+
+        # and on lists ordered otherwise by the resource
+        from example import resources
+
+        with patch.object(resources.Item._meta, 'queryset', Item.objects.order_by('-id')):
+            response = self.deserialize(
+                self.api_client.get(self.list_endpoint,
+                                    format='json',
+                                    data={'limit': 2},
+                                    authentication=self.get_credentials()))
+            self.assertEqual([obj['id'] for obj in response['objects']], ids[::-1][:2])
+            self.assertFalse('cursor=' in response['meta']['next'])
+
+        self.assertHttpBadRequest(
+            self.api_client.get(self.list_endpoint,
+                                format='json',
+                                data={'cursor': 'invalid'},
+                                authentication=self.get_credentials()))
+
+        # valid json which is not a primary key
+        for value in ([[1]], [{'id': 1}], [None], [True], [1, 2], {'id': 1}, 1, ['abc']):
+            self.assertHttpBadRequest(
+                self.api_client.get(self.list_endpoint,
+                                    format='json',
+                                    data={'cursor': base64.urlsafe_b64encode(json.dumps(value))},
+                                    authentication=self.get_credentials()))
+
+    def test_get_list_total_count(self):
+        from example import resources
+
+        def get_meta(**data):
+            return self.deserialize(
+                self.api_client.get(self.list_endpoint,
+                                    format='json',
+                                    data=data,
+                                    authentication=self.get_credentials()))['meta']
+
+        with patch.object(CursorPaginator, 'total_count', None):
+            meta = get_meta(limit=2, offset=2)
+            self.assertEqual(meta['total_count'], None)
+            self.assertTrue(meta['next'])
+
+            self.assertEqual(get_meta(limit=2, offset=3)['next'], None)
+
+            # all objects at once, still with paging links in meta
+            with patch.object(resources.Item._meta, 'max_limit', None):
+                meta = get_meta(limit=0, offset=1)
+                self.assertEqual(meta['limit'], 0)
+                self.assertEqual(meta['next'], None)
+                self.assertEqual(meta['previous'], None)
+
+        with patch.multiple(CursorPaginator, total_count='estimate', estimate_threshold=1):
+            with patch.object(Paginator, 'get_estimated_count', return_value=1000):
+                meta = get_meta(limit=2)
+                self.assertEqual(meta['total_count'], 1000)
+                self.assertTrue(meta['estimated'])
+
+            # counted exactly unless estimated
+            meta = get_meta(limit=2)
+            self.assertEqual(meta['total_count'], 5)
+            self.assertFalse('estimated' in meta)
+
+        class CountlessItem(resources.Item):
+
+            class Meta(resources.Item.Meta):
+
+                total_count = None
+
+        paginator_class = CountlessItem()._meta.paginator_class
+        self.assertTrue(issubclass(paginator_class, CursorPaginator))
+        self.assertEqual(paginator_class.total_count, None)
+
     def test_get_detail_unauthenticated(self):
         self.assertHttpUnauthorized(
             self.api_client.get(self.detail_endpoint))
@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+import logging
+
+from mock import patch
+from rpc_proxy.test import TestCase
+from rpc_proxy.utils import is_enabled_for, logf, set_sampling_rate, truncate
+
+
+logger = logging.getLogger(__name__)
+
+
+class LoggingTest(TestCase):
+
+    def test_truncate(self):
+        self.assertEqual(truncate(123), '123')
+        self.assertEqual(truncate('abc', 5), 'abc')
+        self.assertEqual(truncate('abcdefgh', 5), 'abcde...(3 more)')
+
+    def test_logf(self):
+        data = {'message': 'API called.', 'response': u'あ' * 2000}
+
+        # payloads are truncated by default
+        message = logf(data)
+        self.assertTrue(u'message="API called."' in message)
+        self.assertTrue(u'...(1000 more)' in message)
+        self.assertEqual(len(logf(data, None)), len(message) - len(u'...(1000 more)') + 1000)
+
+    def test_sampling(self):
+        test_logger = logging.getLogger('rpc_proxy.tests.sampling')
+        test_logger.setLevel(logging.DEBUG)
+
+        try:
+            self.assertTrue(is_enabled_for(test_logger, logging.DEBUG))
+
+            set_sampling_rate(test_logger.name, 0)
+            self.assertFalse(is_enabled_for(test_logger, logging.DEBUG))
+
+            set_sampling_rate(test_logger.name, 0.5)
+            with patch('random.random', return_value=0.4):
+                self.assertTrue(is_enabled_for(test_logger, logging.DEBUG))
+            with patch('random.random', return_value=0.6):
+                self.assertFalse(is_enabled_for(test_logger, logging.DEBUG))
+                self.assertFalse(is_enabled_for(test_logger, logging.INFO))
+                # exceptions are never sampled out
+                self.assertTrue(is_enabled_for(test_logger, logging.WARNING))
+                self.assertTrue(is_enabled_for(test_logger, logging.ERROR))
+
+            # disabled levels are never sampled
+            test_logger.setLevel(logging.INFO)
+            set_sampling_rate(test_logger.name, 1)
+            self.assertFalse(is_enabled_for(test_logger, logging.DEBUG))
+        finally:
+            set_sampling_rate(test_logger.name, None)
+            test_logger.setLevel(logging.NOTSET)
@@ -0,0 +1,461 @@
+# -*- coding: utf-8 -*-
+import copy
+import cPickle as pickle
+import json
+import logging
+import marshal
+import math
+import random
+import sys
+import threading
+import time
+import zlib
+
+try:
+    from collections import OrderedDict
+except ImportError, e:
+    try:
+        from django.utils.datastructures import SortedDict as OrderedDict
+    except Exception, e:
+        OrderedDict = dict
+
+
+try:
+    import msgpack
+except ImportError, e:
+    msgpack = None
+
+from rpc_proxy.utils import logf
+
+
+COMPRESSED = 'z'
+STALE_ENTRY = 'rpc_proxy:stale'
+
+logger = logging.getLogger(__name__)
+
+_revalidating = set()
+_revalidating_lock = threading.Lock()
+
+
+def stale_entry(value, timeout, delta=0):
+    """
+    Wraps the value to go stale after the timeout, while the entry itself
+    lives until the cache timeout. ``delta`` is the time taken to fetch the
+    value.
+    """
+    return (STALE_ENTRY, time.time() + timeout, value, delta,)
+
+def read_entry(entry, beta=0):
+    """
+    Returns the value of the cache entry and whether it has gone stale. With
+    ``beta``, entries go stale early at random in proportion to the time
+    taken to fetch them (XFetch) to spread refreshes out in time.
+    """
+    if (isinstance(entry, (tuple, list,)) and
+        len(entry) in (3, 4,) and entry[0] == STALE_ENTRY):
+        expires = entry[1]
+
+        if beta and len(entry) > 3 and entry[3]:
+            expires += entry[3] * beta * math.log(1.0 - random.random())
+
+        return (entry[2], expires <= time.time(),)
+    return (entry, False,)
+
+def acquire_lock(backend, key, timeout):
+    """
+    Locks the key across processes with atomic ``add``, returns False if
+    it's locked by another one.
+    """
+    # memcached takes whole seconds, 0 never expires
+    return backend.add('rpc_proxy:lock:%s' % key, 1, max(int(math.ceil(timeout)), 1))
+
+def release_lock(backend, key):
+    backend.delete('rpc_proxy:lock:%s' % key)
+
+def wait_for(backend, key, timeout, interval=0.05):
+    """
+    Waits for the entry of the key locked by another process, returns None
+    if the lock is released without the entry or the timeout expires.
+    """
+    # read the lock bypassing the process-local cache
+    locks = getattr(backend, 'backend', backend)
+    expires = time.time() + timeout
+
+    while time.time() < expires:
+        time.sleep(interval)
+
+        entry = backend.get(key)
+        if entry is not None:
+            return entry
+
+        if locks.get('rpc_proxy:lock:%s' % key) is None:
+            return None
+
+    return None
+
+def revalidate(key, func, *args):
+    """
+    Calls the function on a background thread to refresh stale entries,
+    unless the key is being revalidated already in the process.
+    """
+    with _revalidating_lock:
+        if key in _revalidating:
+            return None
+        _revalidating.add(key)
+
+    def run():
+        try:
+            func(*args)
+        except Exception, e:
+            logger.warning(logf({
+                'message': 'Failed to revalidate.',
+                'key': key,
+                'error': e,
+            }))
+        finally:
+            with _revalidating_lock:
+                _revalidating.discard(key)
+
+    thread = threading.Thread(target=run)
+    thread.daemon = True
+    thread.start()
+
+    return thread
+
+
+
+def msgpack_loads(data):
+    try:
+        return msgpack.unpackb(data, raw=False)
+    except TypeError, e:
+        # older msgpack
+        return msgpack.unpackb(data, encoding='utf-8')
+
+
+# format name: (tag, dumps, loads)
+FORMATS = {
+    'json': ('j', lambda value: json.dumps(value, separators=(',', ':',)), json.loads,),
+    'marshal': ('m', lambda value: marshal.dumps(value, 2), marshal.loads,),
+    'pickle': ('p', lambda value: pickle.dumps(value, 2), pickle.loads,),
+}
+
+if msgpack is not None:
+    FORMATS['msgpack'] = ('k', lambda value: msgpack.packb(value, use_bin_type=True), msgpack_loads,)
+
+
+class Codec(object):
+    """
+    Encodes cache values in the format, and compresses them with zlib above
+    the threshold size in bytes. Encoded values are tagged with the format so
+    that values encoded in any format can be decoded.
+    """
+
+    def __init__(self, format='json', compress_threshold=None, compress_level=6):
+        if format not in FORMATS:
+            raise ValueError('Unknown cache codec format: %s' % format)
+
+        self.format = format
+        self.compress_threshold = compress_threshold
+        self.compress_level = compress_level
+
+        self._tag, self._dumps, loads = FORMATS[format]
+        self._loads = dict([(tag, loads,) for tag, dumps, loads in FORMATS.values()])
+
+    def dumps(self, value):
+        data = self._tag + self._dumps(value)
+
+        if (self.compress_threshold is not None and
+            len(data) > self.compress_threshold):
+            return COMPRESSED + zlib.compress(data, self.compress_level)
+
+        return data
+
+    def loads(self, data):
+        if not isinstance(data, basestring):
+            # cached without codec
+            return data
+
+        if data[:1] == COMPRESSED:
+            data = zlib.decompress(data[1:])
+
+        if data[:1] in self._loads:
+            return self._loads[data[:1]](data[1:])
+
+        # untagged json
+        return json.loads(data)
+
+
+class LocalCache(object):
+    """
+    Process-local LRU cache with per-entry timeout. Values other than strings
+    are kept pickled like django's local-memory cache so that callers can't
+    mutate cached entries.
+    """
+
+    def __init__(self, max_entries=1000, timeout=60):
+        self.max_entries = max_entries
+        self.timeout = timeout
+        self.hits = 0
+        self.misses = 0
+
+        self._data = OrderedDict()
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self._data)
+
+    def _encode(self, value):
+        if isinstance(value, basestring):
+            return (False, value,)
+        return (True, pickle.dumps(value, pickle.HIGHEST_PROTOCOL),)
+
+    def _decode(self, value):
+        pickled, value = value
+        return pickle.loads(value) if pickled else value
+
+    def get(self, key, default=None):
+        with self._lock:
+            try:
+                expires, value = self._data.pop(key)
+            except KeyError, e:
+                self.misses += 1
+                return default
+
+            if expires is not None and expires <= time.time():
+                self.misses += 1
+                return default
+
+            # most recently used goes last
+            self._data[key] = (expires, value,)
+            self.hits += 1
+
+        return self._decode(value)
+
+    def set(self, key, value, timeout=None):
+        timeout = self.timeout if timeout is None else timeout
+        expires = time.time() + timeout if timeout else None
+        value = self._encode(value)
+
+        with self._lock:
+            self._data.pop(key, None)
+            self._data[key] = (expires, value,)
+
+            while len(self._data) > self.max_entries:
+                # evict least recently used
+                for oldest in self._data:
+                    break
+                del(self._data[oldest])
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def get_many(self, keys):
+        values = {}
+        for key in keys:
+            value = self.get(key)
+            if value is not None:
+                values[key] = value
+        return values
+
+    def set_many(self, data, timeout=None):
+        for key, value in data.items():
+            self.set(key, value, timeout)
+
+    def delete_many(self, keys):
+        for key in keys:
+            self.delete(key)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self):
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'size': len(self._data),
+            'max_entries': self.max_entries,
+        }
+
+
+class TieredCache(object):
+    """
+    Puts an optional process-local cache in front of the shared cache backend.
+    Writes and deletes go through both, entries invalidated in another process
+    can be served locally until the local timeout expires. ``timeout`` is used
+    for writes without explicit timeout instead of the backend default.
+    """
+
+    def __init__(self, backend, local=None, timeout=None):
+        self.backend = backend
+        self.local = local
+        self.timeout = timeout
+
+    def _timeout(self, timeout):
+        return self.timeout if timeout is None else timeout
+
+    def _local_timeout(self, timeout):
+        # never keep entries locally longer than in the backend
+        timeout = self._timeout(timeout)
+        return timeout if timeout and timeout < self.local.timeout else None
+
+    def get(self, key, default=None):
+        if self.local is not None:
+            value = self.local.get(key)
+            if value is not None:
+                return value
+
+        value = self.backend.get(key)
+
+        if value is None:
+            return default
+
+        if self.local is not None:
+            self.local.set(key, value, self._local_timeout(None))
+
+        return value
+
+    def set(self, key, value, timeout=None):
+        self.backend.set(key, value, self._timeout(timeout))
+
+        if self.local is not None:
+            self.local.set(key, value, self._local_timeout(timeout))
+
+    def add(self, key, value, timeout=None):
+        added = self.backend.add(key, value, self._timeout(timeout))
+
+        if self.local is not None:
+            self.local.delete(key)
+
+        return added
+
+    def delete(self, key):
+        if self.local is not None:
+            self.local.delete(key)
+
+        self.backend.delete(key)
+
+    def incr(self, key, delta=1):
+        value = self.backend.incr(key, delta)
+
+        if self.local is not None:
+            self.local.set(key, value, self._local_timeout(None))
+
+        return value
+
+    def get_many(self, keys):
+        values = {}
+
+        if self.local is not None:
+            values = self.local.get_many(keys)
+            keys = [key for key in keys if key not in values]
+
+        if keys:
+            fetched = self.backend.get_many(keys) or {}
+
+            if self.local is not None:
+                self.local.set_many(fetched, self._local_timeout(None))
+
+            values.update(fetched)
+
+        return values
+
+    def set_many(self, data, timeout=None):
+        self.backend.set_many(data, self._timeout(timeout))
+
+        if self.local is not None:
+            self.local.set_many(data, self._local_timeout(timeout))
+
+    def delete_many(self, keys):
+        if self.local is not None:
+            self.local.delete_many(keys)
+
+        self.backend.delete_many(keys)
+
+    def clear(self):
+        if self.local is not None:
+            self.local.clear()
+
+        self.backend.clear()
+
+    def stats(self):
+        return self.local.stats() if self.local is not None else {}
+
+
+class Flight(object):
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.exc_info = None
+        self.result = None
+        self.waiters = 0
+
+
+class SingleFlight(object):
+    """
+    Coalesces concurrent calls with the same key in the process, callers
+    wait for the first call and get a copy of its result. The result is
+    copied before waiters are released so that callers can mutate theirs,
+    calls nobody waits for are not copied.
+    """
+
+    def __init__(self):
+        self.calls = 0
+        self.coalesced = 0
+
+        self._flights = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, func, *args, **kwargs):
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+
+            if leader:
+                flight = self._flights[key] = Flight()
+                self.calls += 1
+            else:
+                flight.waiters += 1
+                self.coalesced += 1
+
+        if not leader:
+            flight.event.wait()
+
+            if flight.exc_info is not None:
+                raise flight.exc_info[0], flight.exc_info[1], flight.exc_info[2]
+
+            # copy the snapshot, which nobody mutates
+            return copy.deepcopy(flight.result)
+
+        result = None
+
+        try:
+            result = func(*args, **kwargs)
+            return result
+        except BaseException, e:
+            # interruptions like gevent timeouts fail the waiters as well
+            flight.exc_info = sys.exc_info()
+            raise
+        finally:
+            with self._lock:
+                del(self._flights[key])
+                waiters = flight.waiters
+
+            # results are mutable, the leader gets the original and waiters
+            # copy a private snapshot taken before they are released
+            if waiters and flight.exc_info is None:
+                try:
+                    flight.result = copy.deepcopy(result)
+                except BaseException, e:
+                    flight.exc_info = sys.exc_info()
+
+            flight.event.set()
+
+    def stats(self):
+        return {
+            'calls': self.calls,
+            'coalesced': self.coalesced,
+        }
@@ -0,0 +1,24 @@
+# -*- coding: utf-8 -*-
+import logging
+
+from rpc_proxy.proxies import disable_identity_map, enable_identity_map
+
+
+logger = logging.getLogger(__name__)
+
+
+class IdentityMapMiddleware(object):
+    """
+    Turns on the identity map of proxy objects during each request, objects
+    resolved for the same resource_uri are loaded once per request.
+    """
+
+    def process_request(self, request):
+        enable_identity_map()
+
+    def process_response(self, request, response):
+        disable_identity_map()
+        return response
+
+    def process_exception(self, request, exception):
+        disable_identity_map()
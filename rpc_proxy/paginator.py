@@ -0,0 +1,201 @@
+# -*- coding: utf-8 -*-
+import base64
+import json
+
+from django.db import connections
+from tastypie.exceptions import BadRequest
+from tastypie.paginator import Paginator as TastypiePaginator
+from urllib import urlencode
+
+
+PK_ORDERING = ('id', 'pk',)
+TOTAL_COUNTS = ('exact', 'estimate', None,)
+
+ESTIMATE_QUERIES = {
+    'mysql': ('SELECT table_rows FROM information_schema.tables '
+              'WHERE table_schema = DATABASE() AND table_name = %s'),
+    'postgresql': 'SELECT reltuples::bigint FROM pg_class WHERE relname = %s',
+}
+
+
+class Paginator(TastypiePaginator):
+    """
+    Fills ``total_count`` of lists as the ``total_count`` attribute says,
+    ``'exact'`` counts the objects, ``'estimate'`` reads the row count of
+    unfiltered tables larger than ``estimate_threshold`` from database
+    statistics and ``None`` skips counting. Estimated counts are flagged with
+    ``estimated`` in meta, ``next`` links are decided by fetching one more
+    object unless counted exactly.
+    """
+    total_count = 'exact'
+    estimate_threshold = 100000
+    estimated = False
+
+    def get_estimated_count(self):
+        """
+        Returns the row count of the table from database statistics, None if
+        the list is filtered or the database doesn't tell.
+        """
+        query = getattr(self.objects, 'query', None)
+
+        if query is None or query.where.children or query.having.children:
+            return None
+
+        sql = ESTIMATE_QUERIES.get(connections[self.objects.db].vendor)
+
+        if sql is None:
+            return None
+
+        cursor = connections[self.objects.db].cursor()
+        cursor.execute(sql, [self.objects.model._meta.db_table])
+        row = cursor.fetchone()
+
+        return int(row[0]) if row and row[0] is not None else None
+
+    def get_count(self):
+        if self.total_count is None:
+            return None
+
+        if self.total_count == 'estimate':
+            count = self.get_estimated_count()
+            if count is not None and count > self.estimate_threshold:
+                self.estimated = True
+                return count
+
+        return super(Paginator, self).get_count()
+
+    def page(self):
+        if self.total_count == 'exact':
+            return super(Paginator, self).page()
+
+        limit = self.get_limit()
+        offset = self.get_offset()
+        objects = self.get_slice(limit + 1 if limit else 0, offset)
+        meta = {
+            'offset': offset,
+            'limit': limit,
+            'next': None,
+            'previous': None,
+            'total_count': self.get_count(),
+        }
+
+        if self.estimated:
+            meta['estimated'] = True
+
+        # next links are all clients have to page by without exact counts,
+        # limit 0 returns the rest of the objects at once
+        if limit:
+            objects = list(objects)
+            meta['previous'] = self.get_previous(limit, offset)
+            meta['next'] = self._generate_uri(limit, offset + limit) if len(objects) > limit else None
+            objects = objects[:limit]
+
+        return {
+            self.collection_name: objects,
+            'meta': meta,
+        }
+
+
+class CursorPaginator(Paginator):
+    """
+    Pages by primary key (``pk > last_pk ORDER BY pk``) instead of offset so
+    that deep pages don't make the database scan and throw away the offset
+    rows. ``next`` links carry an opaque ``cursor`` parameter, requests with
+    ``offset`` and lists ordered other than by primary key, by the request,
+    the resource queryset or the model, fall back to offset paging.
+    """
+
+    def encode_cursor(self, pk):
+        return base64.urlsafe_b64encode(json.dumps([pk]))
+
+    def decode_cursor(self, cursor):
+        try:
+            values = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+
+            # well-formed json of another shape is as invalid as garbage
+            if (not isinstance(values, list) or len(values) != 1 or
+                isinstance(values[0], bool) or not isinstance(values[0], (int, long, basestring,))):
+                raise ValueError('Not a primary key: %r' % (values,))
+
+            return self.objects.model._meta.pk.to_python(values[0])
+        except Exception, e:
+            raise BadRequest("Invalid cursor '%s' provided." % cursor)
+
+    def get_cursor(self):
+        return self.request_data.get('cursor') or None
+
+    def is_cursor_mode(self):
+        query = getattr(self.objects, 'query', None)
+
+        if 'offset' in self.request_data or query is None:
+            return False
+
+        # ordering of the request, the resource queryset or the model
+        ordering = query.order_by or (query.default_ordering and query.model._meta.ordering) or []
+        pk = query.model._meta.pk
+
+        return (not ordering or
+                (len(ordering) == 1 and ordering[0] in PK_ORDERING + (pk.name, pk.attname,)))
+
+    def get_cursor_slice(self, limit, cursor):
+        """
+        Returns the objects after the cursor, and one more to tell if the
+        next page is available.
+        """
+        objects = self.objects.order_by('pk')
+
+        if cursor is not None:
+            objects = objects.filter(pk__gt=self.decode_cursor(cursor))
+
+        if limit == 0:
+            return objects
+
+        return objects[:limit + 1]
+
+    def _generate_cursor_uri(self, limit, cursor):
+        if self.resource_uri is None:
+            return None
+
+        request_params = {}
+
+        for key in self.request_data.keys():
+            if key in ('limit', 'offset', 'cursor',):
+                continue
+
+            values = getattr(self.request_data, 'getlist', lambda key: [self.request_data[key]])(key)
+            request_params[key] = [value.encode('utf-8') if isinstance(value, unicode) else value
+                                   for value in values]
+
+        request_params.update({'limit': [limit], 'cursor': [cursor]})
+
+        return '%s?%s' % (self.resource_uri, urlencode(request_params, True),)
+
+    def page(self):
+        if not self.is_cursor_mode():
+            return super(CursorPaginator, self).page()
+
+        limit = self.get_limit()
+        cursor = self.get_cursor()
+        objects = list(self.get_cursor_slice(limit, cursor))
+        next_cursor = None
+
+        if limit and len(objects) > limit:
+            objects = objects[:limit]
+            next_cursor = self.encode_cursor(objects[-1].pk)
+
+        meta = {
+            'cursor': cursor,
+            'limit': limit,
+            'next': self._generate_cursor_uri(limit, next_cursor) if next_cursor else None,
+            'offset': None,
+            'previous': None,
+            'total_count': self.get_count(),
+        }
+
+        if self.estimated:
+            meta['estimated'] = True
+
+        return {
+            self.collection_name: objects,
+            'meta': meta,
+        }
@@ -1,8 +1,15 @@
 # -*- coding: utf-8 -*-
+import hashlib
 import logging
 import re
+import requests
 import slumber
+import sys
+import threading
+import time
+import weakref
 
+from contextlib import contextmanager
 from datetime import datetime
 from dateutil import parser as dateparser
 from queryset_client import client
@@ -13,7 +20,7 @@ try:
 
     # try to import django suite
     from django.conf import settings
-    from django.core.cache import cache
+    from django.core.cache import cache, get_cache
     from django.db import models
     from django.core.exceptions import ObjectDoesNotExist
     from django.utils.importlib import import_module
@@ -33,6 +40,9 @@ except Exception, e:
     def _(text):
         return text
 
+    def get_cache(backend, **kwargs):
+        return Cache()
+
     settings = object()
     cache = Cache()
     models = None
@@ -40,13 +50,48 @@ except Exception, e:
 
 
 from rpc_proxy import exceptions
-from rpc_proxy.utils import logf
+from rpc_proxy.cache import (Codec, Flight, LocalCache, SingleFlight, TieredCache, acquire_lock, read_entry,
+                             release_lock, revalidate, stale_entry, wait_for)
+from rpc_proxy.utils import is_enabled_for, logf, set_sampling_rate
 
 
+DUMMY_CACHE = 'django.core.cache.backends.dummy.DummyCache'
 PK_ID = ('pk', 'id',)
+PK_LOOKUPS = ('pk', 'pk__exact', 'id', 'id__exact',)
+IN_MEMORY_FIELD_TYPES = {
+    'boolean': (bool,),
+    'float': (int, long, float,),
+    'integer': (int, long,),
+    'string': (basestring,),
+}
+IN_MEMORY_LOOKUPS = {
+    'exact': lambda a, b: a == b,
+    'iexact': lambda a, b: a is not None and a.lower() == b,
+    'contains': lambda a, b: a is not None and b in a,
+    'icontains': lambda a, b: a is not None and b in a.lower(),
+    'startswith': lambda a, b: a is not None and a.startswith(b),
+    'istartswith': lambda a, b: a is not None and a.lower().startswith(b),
+    'endswith': lambda a, b: a is not None and a.endswith(b),
+    'iendswith': lambda a, b: a is not None and a.lower().endswith(b),
+    'in': lambda a, b: a in b,
+    'gt': lambda a, b: a is not None and a > b,
+    'gte': lambda a, b: a is not None and a >= b,
+    'lt': lambda a, b: a is not None and a < b,
+    'lte': lambda a, b: a is not None and a <= b,
+    'isnull': lambda a, b: (a is None) == bool(b),
+}
 
 logger = logging.getLogger(__name__)
 
+_batch = threading.local()
+_identity = threading.local()
+_caches = {}
+_codecs = {}
+
+# coalesces identical concurrent GET requests in the process
+flights = SingleFlight()
+_classes = {}
+
 
 def extend(instance, new_class, attrs={}):
     instance.__class__ = type(new_class.__name__,
@@ -56,6 +101,19 @@ def extend(instance, new_class, attrs={}):
     instance.__module__ = new_class.__module__
     return instance
 
+def extended_class(cls, new_class):
+    """
+    Returns the class combined with the new class carrying the attributes of
+    the new class, which is created once per pair of the classes.
+    """
+    key = (cls, new_class,)
+
+    if key not in _classes:
+        _classes[key] = type(new_class.__name__, (cls, new_class), new_class.__dict__.copy())
+        _classes[key].__module__ = new_class.__module__
+
+    return _classes[key]
+
 def mixin(cls, mixin):
     if mixin not in cls.__bases__:
         cls.__bases__ = (mixin,) + cls.__bases__
@@ -63,6 +121,56 @@ def mixin(cls, mixin):
 def get_setting(name, default=None):
     return getattr(settings, 'TASTYPIE_RPC_PROXY', {}).get(name, default)
 
+# process-local cache in front of the shared cache backend if configured
+cache = TieredCache(cache,
+                    LocalCache(get_setting('LOCAL_CACHE_SIZE'),
+                               get_setting('LOCAL_CACHE_TIMEOUT', 60)) if (
+                        get_setting('LOCAL_CACHE_SIZE')) else None)
+
+# generations have to outlive lists and queries cached under them
+GENERATION_TIMEOUT = get_setting('GENERATION_TIMEOUT', 60 * 60 * 24 * 30)
+
+for name, rate in get_setting('LOG_SAMPLING_RATES', {}).items():
+    set_sampling_rate(name, rate)
+
+def get_proxy_cache(options, schema=False):
+    """
+    Returns the cache following the cache policy of the proxy options, which
+    is the default cache unless an alias or timeouts are specified.
+    """
+    if not options.cache:
+        alias = DUMMY_CACHE
+    elif schema:
+        alias = options.schema_cache_alias or options.cache_alias
+    else:
+        alias = options.cache_alias
+
+    timeout = options.schema_cache_timeout if schema else options.cache_timeout
+
+    if alias is None and timeout is None:
+        return cache
+
+    key = (alias, timeout,)
+
+    if key not in _caches:
+        # process-local cache is only for the default cache
+        _caches[key] = TieredCache(get_cache(alias) if alias else cache.backend,
+                                   cache.local if alias is None else None,
+                                   timeout)
+
+    return _caches[key]
+
+def get_codec(options):
+    """
+    Returns the codec of cache values following the proxy options.
+    """
+    key = (options.cache_codec, options.cache_compress_threshold,)
+
+    if key not in _codecs:
+        _codecs[key] = Codec(*key)
+
+    return _codecs[key]
+
 def get_pk(obj):
     """
     This is a workaroud to seek non default ``id`` primary key value.
@@ -71,13 +179,20 @@ def get_pk(obj):
     This method attempts to resolve such relation based on
     NON_DEFAULT_ID_FOREIGNKEYS settings value.
     """
-    if isinstance(obj, int):
+    if isinstance(obj, (int, long,)):
         return obj
 
-    if isinstance(obj, str):
+    if isinstance(obj, basestring):
+        if obj.isdigit():
+            return int(obj)
+
         # assumed to be a resource_uri
         return client.parse_id(obj)
 
+    if isinstance(obj, Response) and obj._deferred:
+        # no need to load the object
+        return parse_pk(obj._url)
+
     for key in get_setting('NON_DEFAULT_ID_FOREIGNKEYS', {}):
         if hasattr(obj, key):
             try:
@@ -87,20 +202,926 @@ def get_pk(obj):
 
     return obj.id
 
+def parse_pk(resource_uri):
+    """
+    Returns the primary key value in the resource_uri, as an integer if it's
+    numeric.
+    """
+    pk = client.parse_id(resource_uri)
+    return int(pk) if pk.isdigit() else pk
+
+def get_pk_field(model):
+    """
+    Returns the field name to filter the resource by its primary key,
+    ``id`` or one of NON_DEFAULT_ID_FOREIGNKEYS settings value.
+    """
+    fields = model._schema_store.get('fields', {})
+
+    if 'id' in fields:
+        return 'id'
+
+    for key in get_setting('NON_DEFAULT_ID_FOREIGNKEYS', {}):
+        if key in fields:
+            return key
+
+    return None
+
+def fetch_responses(model, resource_uris):
+    """
+    Fetches detail responses of the resource_uris in chunked ``<pk>__in``
+    list requests and returns a dictionary keyed by resource_uri.
+    """
+    responses = {}
+    pk_field = get_pk_field(model)
+
+    if pk_field is None:
+        return responses
+
+    resource_uris = list(set(resource_uris))
+    chunk_size = get_setting('BULK_FETCH_SIZE', 100)
+
+    for i in range(0, len(resource_uris), chunk_size):
+        chunk = resource_uris[i:i + chunk_size]
+
+        if is_enabled_for(logger, logging.DEBUG):
+            logger.debug(logf({
+                'message': 'Fetching objects in bulk...',
+                'resource': model._model_name,
+                'count': len(chunk),
+            }))
+
+        result = model._client.get(**{
+            '%s__in' % pk_field: [client.parse_id(resource_uri) for resource_uri in chunk],
+            'limit': len(chunk),
+        })
+
+        # filters not supported by the resource might be ignored so pick
+        # up requested objects only
+        for response in result.get('objects', []):
+            if response.get('resource_uri') in chunk:
+                responses[response['resource_uri']] = response
+
+    return responses
+
+def fetch_in_background(func, *args):
+    """
+    Calls the function on a background thread, returns a function which
+    waits for and returns the result or raises the error of the call.
+    """
+    flight = Flight()
+
+    def run():
+        try:
+            flight.result = func(*args)
+        except Exception, e:
+            flight.exc_info = sys.exc_info()
+        finally:
+            flight.event.set()
+
+    thread = threading.Thread(target=run)
+    thread.daemon = True
+    thread.start()
+
+    def result():
+        flight.event.wait()
+
+        if flight.exc_info is not None:
+            raise flight.exc_info[0], flight.exc_info[1], flight.exc_info[2]
+
+        return flight.result
+
+    return result
+
+def load_responses(model, resource_uris):
+    """
+    Returns detail responses of the resource_uris keyed by resource_uri, reads
+    cache in a single round trip first and fetches the rest in bulk requests,
+    which are cached in a single round trip as well unless
+    ``cache_list_objects`` is False.
+    """
+    resource_uris = list(set(resource_uris))
+
+    if len(resource_uris) < 1:
+        return {}
+
+    options = get_options(model)
+    codec = get_codec(options)
+    loaded = {}
+    stale = {}
+
+    for resource_uri, entry in (get_proxy_cache(options).get_many(resource_uris) or {}).items():
+        content, expired = read_entry(entry, options.early_refresh)
+        if content:
+            if expired:
+                stale[resource_uri] = codec.loads(content)
+            else:
+                loaded[resource_uri] = codec.loads(content)
+
+    if stale and options.stale_while_revalidate:
+        revalidate('%s:%s' % (model._endpoint, ','.join(sorted(stale.keys())),),
+                   revalidate_responses, model, stale.keys())
+        loaded.update(stale)
+        stale = {}
+
+    if is_enabled_for(logger, logging.DEBUG):
+        logger.debug(logf({
+            'message': 'Loading objects...',
+            'resource': model._model_name,
+            'count': len(resource_uris),
+            'cached': len(loaded),
+        }))
+
+    start = time.time()
+
+    try:
+        fetched = fetch_responses(model, [resource_uri for resource_uri in resource_uris
+                                          if resource_uri not in loaded])
+    except Exception, e:
+        if not stale or not options.stale_if_error or not is_upstream_error(e):
+            raise
+
+        logger.warning(logf({
+            'message': 'Failed to fetch objects, serving stale.',
+            'resource': model._model_name,
+            'error': e,
+        }))
+
+        loaded.update(stale)
+
+        return loaded
+
+    # list representations mustn't be served as details if they differ
+    if options.cache_list_objects:
+        cache_responses(model, fetched.values(), time.time() - start)
+
+    loaded.update(fetched)
+
+    return loaded
+
+def cache_response(model, resource_uri):
+    """
+    Fetches the detail response and caches it.
+    """
+    options = get_options(model)
+    start = time.time()
+    response = getattr(model._main_client, model._model_name)(parse_pk(resource_uri)).get()
+    delta = time.time() - start
+
+    if 'model' in response:
+        del(response['model'])
+
+    content = get_codec(options).dumps(response)
+
+    if is_enabled_for(logger, logging.DEBUG):
+        logger.debug(logf({
+            'message': 'Setting cache...',
+            'key': resource_uri,
+            'value': response,
+        }))
+
+    contents = unique_index(model, [response])
+    contents[resource_uri] = cache_entry(options, content, delta)
+
+    get_proxy_cache(options).set_many(contents)
+
+    return response
+
+def revalidate_responses(model, resource_uris):
+    """
+    Fetches and caches the detail responses again, detail endpoint is used if
+    list and detail representations of the resource differ.
+    """
+    if get_options(model).cache_list_objects:
+        responses = fetch_responses(model, resource_uris).values()
+    else:
+        for resource_uri in resource_uris:
+            flights.do(resource_uri, cache_response, model, resource_uri)
+        return
+
+    cache_responses(model, responses)
+
+def cache_responses(model, responses, delta=0):
+    """
+    Caches the detail responses keyed by resource_uri in a single round trip.
+    """
+    options = get_options(model)
+    codec = get_codec(options)
+    contents = {}
+
+    for response in responses:
+        if not isinstance(response, dict) or not response.get('resource_uri'):
+            continue
+
+        if 'model' in response:
+            response = response.copy()
+            del(response['model'])
+
+        contents[response['resource_uri']] = cache_entry(options, codec.dumps(response), delta)
+        contents.update(unique_index(model, [response]))
+
+    if contents:
+        get_proxy_cache(options).set_many(contents)
+
+def cache_entry(options, value, delta=0):
+    """
+    Returns the value to be cached, which expires softly after
+    ``stale_timeout`` if specified in the proxy options.
+    """
+    return stale_entry(value, options.stale_timeout, delta) if options.stale_timeout else value
+
+def get_or_fetch(key, proxy_cache, options, func, *args, **kwargs):
+    """
+    Returns the cached value of the key or calls the function to fetch and
+    cache the value. Concurrent calls in the process share a single call,
+    stale values are served and refreshed following the cache policy of the
+    proxy options.
+    """
+    loads = kwargs.get('loads') or (lambda value: value)
+
+    if is_enabled_for(logger, logging.DEBUG):
+        logger.debug(logf({
+            'message': 'Getting cache...',
+            'key': key,
+        }))
+
+    cached, stale = read_entry(proxy_cache.get(key), options.early_refresh)
+
+    if cached is not None:
+        if not stale:
+            value = loads(cached)
+
+            if is_enabled_for(logger, logging.DEBUG):
+                logger.debug(logf({
+                    'message': 'Found in cache.',
+                    'key': key,
+                    'value': value,
+                }))
+
+            return value
+
+        if options.stale_while_revalidate:
+            if is_enabled_for(logger, logging.DEBUG):
+                logger.debug(logf({
+                    'message': 'Found stale in cache, revalidating...',
+                    'key': key,
+                }))
+
+            revalidate(key, refresh_entry, key, proxy_cache, options, func, *args)
+
+            return loads(cached)
+
+    locked = False
+
+    if options.stampede_lock:
+        locked = acquire_lock(proxy_cache, key, options.stampede_lock_timeout)
+
+        if not locked:
+            # another process is fetching, serve stale or wait for it
+            if cached is None:
+                cached, stale = read_entry(wait_for(proxy_cache, key,
+                                                    options.stampede_lock_timeout))
+
+            if cached is not None:
+                return loads(cached)
+
+    try:
+        return flights.do(key, func, *args)
+    except Exception, e:
+        if cached is None or not options.stale_if_error or not is_upstream_error(e):
+            raise
+
+        logger.warning(logf({
+            'message': 'Failed to fetch resource, serving stale.',
+            'key': key,
+            'error': e,
+        }))
+
+        return loads(cached)
+    finally:
+        if locked:
+            release_lock(proxy_cache, key)
+
+def refresh_entry(key, proxy_cache, options, func, *args):
+    if options.stampede_lock:
+        if not acquire_lock(proxy_cache, key, options.stampede_lock_timeout):
+            return
+
+    try:
+        flights.do(key, func, *args)
+    finally:
+        if options.stampede_lock:
+            release_lock(proxy_cache, key)
+
+def is_upstream_error(e):
+    """
+    Returns True if the exception is caused by connection failures or server
+    errors, which allow serving stale cache.
+    """
+    if isinstance(e, requests.exceptions.RequestException):
+        return True
+
+    status_code = getattr(getattr(e, 'response', None), 'status_code',
+                          getattr(e, 'status_code', None))
+
+    return status_code is not None and status_code >= 500
+
+def get_generation(endpoint, backend=cache):
+    """
+    Returns the current generation of the resource, which is folded into
+    list and query cache keys. Generations are read from the shared backend,
+    bumps in other processes can't wait for the process-local cache.
+    """
+    backend = getattr(backend, 'backend', backend)
+    key = 'rpc_proxy:generation:%s' % endpoint
+    generation = backend.get(key)
+
+    if generation is None:
+        # start from the current time in milliseconds, which is above any
+        # generation bumped before the key expired or got evicted
+        backend.add(key, int(time.time() * 1000), GENERATION_TIMEOUT)
+        generation = backend.get(key)
+
+    return generation
+
+def bump_generation(endpoint, backend=cache):
+    """
+    Invalidates all list and query caches of the resource at once.
+    """
+    try:
+        return getattr(backend, 'backend', backend).incr('rpc_proxy:generation:%s' % endpoint)
+    except ValueError, e:
+        return get_generation(endpoint, backend)
+
+def request_cache_key(url, backend=cache):
+    """
+    Returns the cache key of the GET request, list requests are keyed by the
+    generation of the resource.
+    """
+    if '?' not in url:
+        return url
+
+    endpoint = url.split('?', 1)[0]
+
+    return 'rpc_proxy:list:%s:%s:%s' % (endpoint,
+                                        get_generation(endpoint, backend),
+                                        hashlib.md5(url.encode('utf-8') if isinstance(url, unicode) else url).hexdigest(),)
+
+def normalize_value(value):
+    """
+    Returns the lookup value as a string to build cache keys.
+    """
+    if not isinstance(value, (basestring, int, long, float, bool,)):
+        # related objects
+        value = getattr(value, 'resource_uri', value)
+    return value.encode('utf-8') if isinstance(value, unicode) else str(value)
+
+def query_cache_key(model, query, backend=cache, prefix='query'):
+    """
+    Returns the cache key of the list query, which is normalized by sorting
+    parameters and values of ``__in`` lookups, under the generation of the
+    resource.
+    """
+    params = []
+
+    for key, value in sorted(query.items()):
+        values = value if isinstance(value, (list, tuple, set,)) else [value]
+        values = [normalize_value(v) for v in values]
+        params.append((key, sorted(values) if key.endswith('__in') else values,))
+
+    return 'rpc_proxy:%s:%s:%s:%s' % (prefix,
+                                      model._endpoint,
+                                      get_generation(model._endpoint, backend),
+                                      hashlib.md5(urlencode(params, True)).hexdigest(),)
+
+def get_unique_fields(model):
+    """
+    Returns the fields to look objects up by the unique key index, which are
+    declared in proxy Meta class or detected from the schema.
+    """
+    unique_fields = get_options(model).unique_fields
+
+    if unique_fields is not None:
+        return unique_fields
+
+    return [name for name, field in model._schema_store.get('fields', {}).items()
+            if field.get('unique') and name not in PK_ID + ('resource_uri',)]
+
+def unique_cache_key(model, field, value):
+    return 'rpc_proxy:unique:%s:%s:%s' % (model._endpoint,
+                                          field,
+                                          hashlib.md5(normalize_value(value)).hexdigest(),)
+
+def unique_index(model, responses):
+    """
+    Returns the unique key index entries of the responses to be cached, which
+    map unique field values to resource_uri.
+    """
+    fields = get_unique_fields(model)
+    index = {}
+
+    for response in responses:
+        if not fields or not response.get('resource_uri'):
+            continue
+
+        for field in fields:
+            if response.get(field) is not None:
+                index[unique_cache_key(model, field, response[field])] = response['resource_uri']
+
+    return index
+
+def filter_responses(model, objects, **kwargs):
+    """
+    Filters the objects in memory, returns None if any of the lookups can't be
+    evaluated locally.
+    """
+    fields = model._schema_store.get('fields', {})
+    filters = []
+
+    for key, value in kwargs.items():
+        name, _, lookup = key.partition('__')
+        lookup = lookup or 'exact'
+
+        if (name not in fields or
+            fields[name].get('type') not in IN_MEMORY_FIELD_TYPES or
+            lookup not in IN_MEMORY_LOOKUPS):
+            return None
+
+        if lookup in ('in',) and not isinstance(value, (list, tuple, set,)):
+            value = [value]
+
+        if lookup not in ('isnull',):
+            # leave type conversions to the api
+            types = IN_MEMORY_FIELD_TYPES[fields[name]['type']]
+            for v in (value if lookup in ('in',) else [value]):
+                if not isinstance(v, types) or (isinstance(v, bool) and
+                                                bool not in types):
+                    return None
+
+        if lookup.startswith('i') and lookup not in ('in', 'isnull',):
+            value = value.lower()
+
+        filters.append((name, IN_MEMORY_LOOKUPS[lookup], value,))
+
+    def match(obj):
+        response = obj._response if isinstance(obj, Response) else obj
+        for name, lookup, value in filters:
+            try:
+                if not lookup(response.get(name), value):
+                    return False
+            except TypeError, e:
+                return False
+        return True
+
+    return [obj for obj in objects if match(obj)]
+
+def select_related_objects(objects, name, model):
+    """
+    Resolves the to_one field of the objects in bulk and returns the list of
+    related objects.
+    """
+    related = []
+    resource_uris = []
+
+    for obj in objects:
+        if name in obj._related_objects:
+            related.append(obj._related_objects[name])
+            continue
+
+        resource_uri = obj._response[name]
+        if isinstance(resource_uri, dict):
+            # full representation
+            obj._related_objects[name] = make_response(model, resource_uri)
+            related.append(obj._related_objects[name])
+        elif resource_uri:
+            resource_uris.append(resource_uri)
+
+    responses = load_responses(model, resource_uris)
+    instances = {}
+
+    for obj in objects:
+        resource_uri = obj._response[name]
+        if name in obj._related_objects or resource_uri not in responses:
+            continue
+
+        if resource_uri not in instances:
+            instances[resource_uri] = make_response(model, responses[resource_uri])
+            related.append(instances[resource_uri])
+
+        obj._related_objects[name] = instances[resource_uri]
+
+    return related
+
+def prefetch_related_objects(objects, name, model):
+    """
+    Resolves the to_many field of the objects in bulk, hands each object a
+    pre-filled manager and returns the list of related objects.
+    """
+    related = []
+    resource_uris = []
+
+    for obj in objects:
+        if name in obj._related_objects:
+            related.extend(obj._related_objects[name]._prefetched or [])
+            continue
+
+        resource_uris.extend([resource_uri for resource_uri in obj._response[name] or []
+                              if not isinstance(resource_uri, dict)])
+
+    responses = load_responses(model, resource_uris)
+    instances = {}
+
+    for obj in objects:
+        if name in obj._related_objects:
+            continue
+
+        prefetched = []
+        for resource_uri in obj._response[name] or []:
+            if isinstance(resource_uri, dict):
+                # full representation
+                prefetched.append(make_response(model, resource_uri))
+                continue
+
+            if resource_uri not in responses:
+                # leave it to the manager to request
+                prefetched = None
+                break
+
+            if resource_uri not in instances:
+                instances[resource_uri] = make_response(model, responses[resource_uri])
+
+            prefetched.append(instances[resource_uri])
+
+        if prefetched is None:
+            continue
+
+        related.extend(prefetched)
+        obj._related_objects[name] = ManyToManyManager(
+                                         model=model,
+                                         instance=obj.model,
+                                         field_name=name,
+                                         query={'id__in': [client.parse_id(instance._response['resource_uri'])
+                                                           for instance in prefetched]},
+                                         prefetched=prefetched)
+
+    return related
+
+def related_objects(objects, name):
+    """
+    Resolves the related field of the objects in bulk and returns the list of
+    related objects to follow the lookup further.
+    """
+    objects = [obj for obj in objects if isinstance(obj, Response) and
+                                         name in obj._response]
+
+    if len(objects) < 1:
+        return []
+
+    model, related_type = objects[0]._related_model(name)
+
+    if related_type == 'to_many':
+        return prefetch_related_objects(objects, name, model)
+
+    return select_related_objects(objects, name, model)
+
+
+def get_options(model):
+    """
+    Returns the proxy options of the model, or the default options if no proxy
+    is defined for the model.
+    """
+    proxy = ProxyClient._proxies.get(model._model_name.lower())
+    return proxy._meta if proxy else ProxyOptions
+
+def get_identity_map():
+    """
+    Returns the identity map of the thread, None unless it's turned on.
+    """
+    return getattr(_identity, 'map', None)
+
+def enable_identity_map():
+    _identity.map = {}
+
+def disable_identity_map():
+    _identity.map = None
+
+@contextmanager
+def identity_map():
+    """
+    Turns on the identity map within the block, responses resolved for the
+    same resource_uri are the same object until the block exits.
+    """
+    enabled = get_identity_map() is not None
+
+    if not enabled:
+        enable_identity_map()
+
+    try:
+        yield get_identity_map()
+    finally:
+        if not enabled:
+            disable_identity_map()
+
+def make_response(model, response=None, url=None, **kwargs):
+    """
+    Returns the response object, which is shared by resource_uri within the
+    identity map if turned on.
+    """
+    identities = get_identity_map()
+    resource_uri = url or (response.get('resource_uri') if isinstance(response, dict) else None)
+
+    if identities is None or not resource_uri:
+        return Response(model, response, url, **kwargs)
+
+    if resource_uri not in identities:
+        identities[resource_uri] = Response(model, response, url, **kwargs)
+    elif response is not None and identities[resource_uri]._deferred:
+        identities[resource_uri].refresh(response)
+
+    return identities[resource_uri]
+
+def get_pending_responses():
+    if not hasattr(_batch, 'pending'):
+        _batch.pending = {}
+    return _batch.pending
+
+def schedule_response(response):
+    """
+    Registers the lazy response to the per-thread batch scheduler so that it's
+    loaded in bulk with the other pending responses of the same resource.
+    """
+    pending = get_pending_responses().setdefault(response.model._endpoint, {})
+
+    if len(pending) >= get_setting('BULK_FETCH_SIZE', 100):
+        # prune responses already collected
+        for url, refs in pending.items():
+            if not [ref for ref in refs if ref() is not None]:
+                del(pending[url])
+
+    pending.setdefault(response._url, []).append(weakref.ref(response))
+
+def schedule_related(obj, name, model):
+    """
+    Creates lazy responses of the to_one field for all objects in the same page
+    as the object, and registers them to the batch scheduler.
+    """
+    responses = {}
+
+    for sibling in obj.__dict__.get('_siblings') or [obj]:
+        if (not isinstance(sibling, Response) or
+            name in sibling._related_objects):
+            continue
+
+        url = sibling._response.get(name)
+        if not isinstance(url, basestring):
+            continue
+
+        if url not in responses:
+            responses[url] = make_response(model=model, url=url)
+            if responses[url]._deferred:
+                schedule_response(responses[url])
+
+        sibling._related_objects[name] = responses[url]
+
+    return obj._related_objects.get(name)
+
+def load_pending_responses(model):
+    """
+    Loads all pending responses of the resource in bulk.
+    """
+    responses = {}
+
+    for url, refs in get_pending_responses().pop(model._endpoint, {}).items():
+        instances = [ref() for ref in refs if ref() is not None]
+        if instances:
+            responses[url] = instances
+
+    for url, response in load_responses(model, responses.keys()).items():
+        for instance in responses[url]:
+            instance.refresh(dict(response))
+
 
 class QuerySet(client.QuerySet):
 
     def __init__(self, model, responses=None, query=None, **kwargs):
+        self._prefetch_related = ()
+        self._select_related = ()
+        self._offset = 0
+        self._limit = None
         super(QuerySet, self).__init__(model, responses, query, **kwargs)
         self._response_class = Response
 
-    def __getitem__(self, index):
-        try:
-            return super(QuerySet, self).__getitem__(index)
-        except IndexError, e:
+    def __len__(self):
+        objects = self._objects
+
+        if self._meta.get('total_count') is not None and not self._meta.get('estimated'):
+            return self.count()
+
+        # count loaded objects of all pages
+        for obj in self:
             pass
 
+        return len(objects) if self._limit is None else min(len(objects), self._limit)
+
+    def __iter__(self):
+        objects = self._objects
+        index = 0
+
+        # follow next links rather than total_count, which may be skipped
+        # or estimated by the resource
+        while True:
+            while index < len(objects):
+                if self._limit is not None and index >= self._limit:
+                    return
+                yield objects[index]
+                index += 1
+
+            if not self._next_url or (self._limit is not None and index >= self._limit):
+                return
+
+            self._load_next()
+            objects = self._objects
+
+    def _load_next(self):
+        responses = self._request(self._next_url)
+        self._next_url = responses['meta'].get('next')
+
+        client.QuerySet._objects.fget(self).extend(responses['objects'])
+        self._related_resolved = False
+
+    def _set_objects(self, responses):
+        super(QuerySet, self)._set_objects(responses)
+        self._next_url = responses and responses['meta'].get('next')
+
+    def _get_objects(self):
+        if self._responses is None:
+            # evaluate lazily
+            self._fill_objects()
+
+        objects = client.QuerySet._objects.fget(self)
+
+        if ((self._select_related or self._prefetch_related) and
+            not self._related_resolved):
+            # resolve related objects of the page in bulk
+            self._related_resolved = True
+            for lookup in self._select_related + self._prefetch_related:
+                related = objects
+                for name in lookup.split('__'):
+                    related = related_objects(related, name)
+
+        return objects
+
+    def _set_objects_value(self, value):
+        client.QuerySet._objects.fset(self, value)
+        self._related_resolved = False
+
+    _objects = property(_get_objects, _set_objects_value)
+
+    def _get_responses(self, **kwargs):
+        options = get_options(self.model)
+
+        # cached queries are hydrated from the objects cached as details
+        if not options.cache_queries or not options.cache_list_objects:
+            return self._cache_objects(super(QuerySet, self)._get_responses(**kwargs))
+
+        proxy_cache = get_proxy_cache(options)
+        key = query_cache_key(self.model, kwargs, proxy_cache)
+        cached = proxy_cache.get(key)
+
+        if cached is not None:
+            # hydrate from the detail cache
+            loaded = load_responses(self.model, cached['objects'])
+
+            if len(loaded) == len(set(cached['objects'])):
+                return {
+                    'meta': cached['meta'],
+                    'objects': [loaded[resource_uri] for resource_uri in cached['objects']],
+                }
+
+        responses = super(QuerySet, self)._get_responses(**kwargs)
+
+        if isinstance(responses, dict) and 'objects' in responses:
+            cache_responses(self.model, responses['objects'])
+            proxy_cache.set(key, {
+                'meta': responses.get('meta'),
+                'objects': [response['resource_uri'] for response in responses['objects']],
+            })
+
+        return responses
+
+    def _request(self, url):
+        return self._cache_objects(super(QuerySet, self)._request(url))
+
+    def _cache_objects(self, responses):
+        # warm the detail cache with the objects in the list
+        if (isinstance(responses, dict) and
+            get_options(self.model).cache_list_objects):
+            cache_responses(self.model, responses.get('objects') or [])
+        return responses
+
+    def _clone(self, responses=None, klass=None, **kwargs):
+        kwargs.setdefault('_prefetch_related', self._prefetch_related)
+        kwargs.setdefault('_select_related', self._select_related)
+        kwargs.setdefault('_offset', self._offset)
+        kwargs.setdefault('_limit', self._limit)
+        return super(QuerySet, self)._clone(responses, klass, **kwargs)
+
+    def _chain(self, **kwargs):
+        """
+        Returns an unevaluated copy of the query set.
+        """
+        clone = self._clone(**kwargs)
+        clone._query = dict(self._query)
+        clone._set_objects(None)
+        return clone
+
+    def _page_query(self, **kwargs):
+        # tastypie takes limit=0 as no limit, empty slices aren't requested
+        query = dict(self._query)
+        if self._offset:
+            query['offset'] = self._offset
+        if self._limit is not None:
+            query['limit'] = self._limit
+        query.update(kwargs)
+        return query
+
+    def _fill_objects(self):
+        if self._limit == 0:
+            self._set_objects({
+                'meta': {
+                    'limit': 0,
+                    'next': None,
+                    'offset': self._offset,
+                    'previous': None,
+                    'total_count': 0,
+                },
+                'objects': [],
+            })
+        else:
+            self._set_objects(self._get_responses(**self._page_query()))
+
+    def __getitem__(self, index):
+        if not isinstance(index, (slice, int, long,)):
+            raise TypeError
+
+        assert ((not isinstance(index, slice) and (index >= 0)) or
+                (isinstance(index, slice) and (index.start is None or index.start >= 0) and
+                 (index.stop is None or index.stop >= 0))), \
+            'Negative indexing is not supported.'
+
+        loaded = self._objects if self._responses is not None else []
+        complete = self._responses is not None and not self._next_url
+
+        if self._limit is not None and len(loaded) >= self._limit:
+            loaded, complete = loaded[:self._limit], True
+
+        if isinstance(index, slice):
+            start = index.start or 0
+            stop = index.stop
+
+            if self._responses is not None and (complete or (stop is not None and stop <= len(loaded))):
+                # sliced in memory
+                return self._evaluated(loaded[index], start)
+
+            # push the slice down to limit and offset of the request
+            limit = None if stop is None else max(stop - start, 0)
+            if self._limit is not None:
+                limit = max(self._limit - start, 0) if limit is None else min(limit, max(self._limit - start, 0))
+
+            clone = self._chain(_offset=self._offset + start, _limit=limit)
+
+            return list(clone)[::index.step] if index.step else clone
+
+        if index < len(loaded):
+            return loaded[index]
+
+        if self._limit is not None and index >= self._limit:
+            raise IndexError('list index out of range')
+
+        if complete:
+            raise IndexError('list index out of range')
+
+        return list(self[index:index + 1])[0]
+
+    def _evaluated(self, objects, start=0):
+        """
+        Returns a copy of the query set evaluated to the objects, which are
+        sliced from the loaded ones.
+        """
+        return self._clone({
+            'meta': {
+                'limit': len(objects),
+                'next': None,
+                'offset': self._offset + start,
+                'previous': None,
+                'total_count': None,
+            },
+            'objects': objects,
+        }, _offset=self._offset + start, _limit=len(objects), _related_resolved=True)
+
     def _filter(self, *args, **kwargs):
+        assert self._offset == 0 and self._limit is None, \
+            'Cannot filter a query once a slice has been taken.'
+
         for key, value in kwargs.items():
             try:
                 # convert resource_uri to numeric id
@@ -108,16 +1129,166 @@ class QuerySet(client.QuerySet):
                 kwargs[key] = id
             except Exception, e:
                 pass
-        return super(QuerySet, self)._filter(*args, **kwargs)
+
+        # filters are merged into a request on evaluation
+        clone = self._chain()
+        clone._query.update(kwargs)
+        return clone
+
+    def _get_total_count(self, fetch=True):
+        """
+        Returns ``total_count`` of the query from the cache, or requests a
+        single object to read it unless ``fetch`` is False. Counts are cached
+        under the generation of the resource with ``cache_queries``.
+        """
+        options = get_options(self.model)
+        proxy_cache = get_proxy_cache(options) if options.cache_queries else None
+        key = None
+
+        if proxy_cache is not None:
+            key = query_cache_key(self.model, self._query, proxy_cache, 'count')
+            total_count = proxy_cache.get(key)
+            if total_count is not None:
+                return total_count
+
+        if not fetch:
+            return None
+
+        meta = self._get_responses(**dict(self._query, limit=1))['meta']
+        total_count = meta.get('total_count')
+
+        if key is not None and total_count is not None and not meta.get('estimated'):
+            proxy_cache.set(key, total_count)
+
+        return total_count
+
+    def count(self):
+        """
+        Returns ``total_count`` of the query, or counts objects by fetching
+        all the pages if the resource skips counting, which walks the whole
+        table for unfiltered querysets.
+        """
+        if self._limit == 0:
+            return 0
+
+        if self._responses is not None:
+            total_count = self._meta.get('total_count')
+        else:
+            total_count = self._get_total_count()
+
+        if total_count is None:
+            # the resource skips counting
+            return len(self)
+
+        count = max(total_count - self._offset, 0)
+
+        return count if self._limit is None else min(count, self._limit)
+
+    def exists(self):
+        if self._responses is not None:
+            return bool(self._objects)
+
+        if self._limit == 0:
+            return False
+
+        if not self._offset:
+            total_count = self._get_total_count(fetch=False)
+            if total_count is not None:
+                return total_count > 0
+
+        return bool(self._get_responses(**self._page_query(limit=1))['objects'])
+
+    def latest(self, field_name=None):
+        assert bool(field_name), \
+            "latest() requires either a field_name parameter or 'get_latest_by' in the model"
+        return self.order_by('-%s' % field_name)[0]
 
     def _wrap_response(self, dictionary):
-        return self._response_class(self.model,
-                                    dictionary,
-                                    _to_many_class=ManyToManyManager)
+        if self.__dict__.get('_streaming'):
+            # objects yielded by iterator() are referred to by the caller only
+            return Response(self.model, dictionary, _to_many_class=ManyToManyManager)
+
+        response = make_response(self.model,
+                                 dictionary,
+                                 _to_many_class=ManyToManyManager)
+
+        # objects in the same page to load related objects in batch, read
+        # from the list stored by client.QuerySet, which is being wrapped
+        response.__dict__['_siblings'] = self.__dict__['_QuerySet__objects']
+
+        return response
+
+    def get(self, *args, **kwargs):
+        options = get_options(self.model)
+
+        if args or not options.not_found_timeout:
+            return self._get(*args, **kwargs)
+
+        # remember missing objects for a while
+        proxy_cache = get_proxy_cache(options)
+        key = query_cache_key(self.model, dict(self._query, **kwargs), proxy_cache, 'not_found')
+
+        if proxy_cache.get(key):
+            raise client.ObjectDoesNotExist('%s matching query does not exist.' % self.model._model_name)
+
+        try:
+            return self._get(**kwargs)
+        except client.ObjectDoesNotExist, e:
+            proxy_cache.set(key, True, options.not_found_timeout)
+            raise
+
+    def _get(self, *args, **kwargs):
+        if (args or self._query or self._responses or self._offset or
+            self._limit is not None or len(kwargs) != 1):
+            return super(QuerySet, self).get(*args, **kwargs)
+
+        lookup, value = kwargs.items()[0]
+
+        if lookup not in PK_LOOKUPS:
+            return self._get_unique(lookup, value) or super(QuerySet, self).get(**kwargs)
+
+        if not (isinstance(value, (int, long,)) or
+                (isinstance(value, basestring) and value.isdigit())):
+            return super(QuerySet, self).get(**kwargs)
+
+        # read the detail, which is likely to be cached
+        response = make_response(model=self.model,
+                                 url='%s%s/' % (self.model._endpoint, '%s' % value,))
+        try:
+            response._response
+        except slumber.exceptions.HttpClientError, e:
+            if getattr(getattr(e, 'response', None), 'status_code', None) == 404:
+                raise client.ObjectDoesNotExist('%s matching query does not exist.' % self.model._model_name)
+            raise
+
+        return response
+
+    def _get_unique(self, lookup, value):
+        field = lookup[:-len('__exact')] if lookup.endswith('__exact') else lookup
+
+        if field not in get_unique_fields(self.model):
+            return None
+
+        resource_uri = get_proxy_cache(get_options(self.model)).get(
+            unique_cache_key(self.model, field, value))
+
+        if not resource_uri:
+            return None
+
+        response = make_response(model=self.model, url=resource_uri)
+
+        try:
+            # the index might be out of date
+            if normalize_value(response._response.get(field)) == normalize_value(value):
+                return response
+        except slumber.exceptions.HttpClientError, e:
+            pass
+
+        return None
 
     def create(self, **kwargs):
         obj = super(QuerySet, self).create(**kwargs)
-        return Response(model=self.model, url=obj.resource_uri)
+        return make_response(model=self.model, url=obj.resource_uri)
 
     def get_or_create(self, **kwargs):
         obj, created = super(QuerySet, self).get_or_create(**kwargs)
@@ -125,22 +1296,68 @@ class QuerySet(client.QuerySet):
             return obj, created
         return self.create(**kwargs), True
 
+    def iterator(self, chunk_size=None):
+        """
+        Yields objects page by page following ``meta.next`` links without
+        keeping earlier pages, the next page is fetched on a background
+        thread while the current one is consumed. Fetched objects are not
+        shared through the identity map.
+        """
+        remaining = self._limit
+
+        if self._responses is not None and not chunk_size:
+            # continue from the pages loaded already
+            objects, next_url = self._objects, self._next_url
+        elif remaining == 0:
+            return
+        else:
+            query = self._page_query()
+            if chunk_size:
+                query['limit'] = chunk_size if remaining is None else min(chunk_size, remaining)
+            responses = self._get_responses(**query)
+            objects, next_url = self._clone(responses, _streaming=True)._objects, responses['meta'].get('next')
+
+        while True:
+            if remaining is not None:
+                # stop at the end of the slice
+                objects = objects[:remaining]
+                remaining -= len(objects)
+                if remaining == 0:
+                    next_url = None
+
+            next_page = fetch_in_background(self._request, next_url) if next_url else None
+
+            for obj in objects:
+                yield obj
+
+            if next_page is None:
+                return
+
+            responses = next_page()
+            objects, next_url = self._clone(responses, _streaming=True)._objects, responses['meta'].get('next')
+
+    def prefetch_related(self, *fields):
+        return self._clone(_prefetch_related=self._prefetch_related + fields)
+
+    def select_related(self, *fields):
+        return self._clone(_select_related=self._select_related + fields)
+
 
 class Response(client.Response):
 
     def __init__(self, model, response=None, url=None, **kwargs):
+        self._related_objects = {}
+
         # implement proxy mixin
         model_name = model._model_name.lower()
         if model_name in ProxyClient._proxies:
             proxy = ProxyClient._proxies[model_name].__class__
-            extend(self, proxy, proxy.__dict__.copy())
+            self.__class__ = extended_class(self.__class__, proxy)
+            self.__module__ = proxy.__module__
             self.__init_proxy__()
 
         super(Response, self).__init__(model, response, url, **kwargs)
 
-        # the magic
-        dir(self)
-
     def __repr__(self):
         if hasattr(self, 'resource_uri'):
             return self.resource_uri
@@ -150,6 +1367,17 @@ class Response(client.Response):
         """
         Overrides to support api namespace and to_one class diversity.
         """
+        if name.startswith('__') and name.endswith('__'):
+            # never load the object for special attributes
+            raise AttributeError(name)
+
+        if self._deferred:
+            # answer from the resource_uri without loading the object
+            if name == 'resource_uri':
+                return self._url
+            elif name in PK_ID:
+                return get_pk(self)
+
         try:
             if name not in self._response:
                 raise AttributeError(name)
@@ -163,6 +1391,66 @@ class Response(client.Response):
 
             return getattr(self.model, name)
 
+        related_objects = self.__dict__.get('_related_objects', {})
+        if name in related_objects:
+            related = related_objects[name]
+
+            # set manager alias
+            if (isinstance(related, ManyToManyManager) and
+                name != related.model._model_name):
+                setattr(self.model, related.model._model_name, getattr(self.model, name))
+
+            return related
+
+        model, related_type = self._related_model(name)
+        resource_name = model._model_name
+
+        # set manager alias
+        if name is not resource_name:
+            setattr(self.model, resource_name, getattr(self.model, name))
+
+        if related_type == 'to_many':
+            resource_uris = [resource_uri['resource_uri'] if isinstance(resource_uri, dict) else resource_uri for resource_uri in self._response[name]]
+            return ManyToManyManager(
+                       model=model,
+                       instance=self.model,
+                       field_name=name,
+                       query={'id__in': [client.parse_id(resource_uri) for resource_uri in resource_uris]})
+
+        elif related_type == 'to_one':
+            if get_options(model).batch_loading:
+                response = schedule_related(self, name, model)
+                if response is not None:
+                    return response
+
+            return make_response(model=model, url=self._response[name])
+
+    def __setattr__(self, name, value):
+        if 'model' in self.__dict__:
+            own = name in self.__dict__ or hasattr(self.__class__, name)
+
+            if self._deferred and not own:
+                # load the object before writing fields rather than filling
+                # the deferred response
+                self._response
+
+            if own and name not in (self.__dict__.get('_Response__response') or {}):
+                # attributes of the object itself aren't response data
+                self.__dict__[name] = value
+                return
+
+        super(Response, self).__setattr__(name, value)
+
+    def _related_model(self, name):
+        """
+        Returns a tuple of the model class and the related type of the
+        related field, which is resolved once per model and field as soon
+        as the schema of the related model is fetched.
+        """
+        key = (self.model._endpoint, name,)
+        if key in ProxyClient._relations:
+            return ProxyClient._relations[key]
+
         # resolves foreign key references in another api namespace
         # expects to be called with detail url like /api/v1/<resource>/<id>|schema/
         #
@@ -184,14 +1472,18 @@ class Response(client.Response):
                         schema_uri = schema_uri['resource_uri'] if (
                             isinstance(schema_uri, dict)) else schema_uri
 
-                        logger.debug(logf({
-                            'message': 'Trying to guess schema info from '
-                                       'schema_uri.',
-                            'schema_uri': schema_uri,
-                        }))
+                        if is_enabled_for(logger, logging.DEBUG):
+                            logger.debug(logf({
+                                'message': 'Trying to guess schema info from '
+                                           'schema_uri.',
+                                'schema_uri': schema_uri,
+                            }))
                     except Exception, e:
                         raise exceptions.ProxyException(_('Couldn\'t identify related '
                                                           'field schema (%s).') % name)
+            else:
+                raise exceptions.ProxyException(_('The field seems not to be a related '
+                                                  'field (%s).') % name)
         else:
             raise exceptions.ProxyException(_('The field seems not to be defined '
                                               'in the schema (%s).') % name)
@@ -208,16 +1500,17 @@ class Response(client.Response):
         if version in paths: paths.remove(version)
         namespace = '/'.join(paths)
 
-        logger.debug(logf({
-            'message': 'Need namespace schema.',
-            'attribute': name,
-            'resource_uri': self._response[name],
-            'client_key': ProxyClient.build_client_key(base_client._api_url, **{
-                'version': base_client._version,
-                'namespace': namespace,
-                'auth': base_client._auth,
-            }),
-        }))
+        if is_enabled_for(logger, logging.DEBUG):
+            logger.debug(logf({
+                'message': 'Need namespace schema.',
+                'attribute': name,
+                'schema_uri': schema_uri,
+                'client_key': ProxyClient.build_client_key(base_client._api_url, **{
+                    'version': base_client._version,
+                    'namespace': namespace,
+                    'auth': base_client._auth,
+                }),
+            }))
 
         proxy_client = ProxyClient.get(base_client._api_url,
                                        version=base_client._version,
@@ -225,66 +1518,56 @@ class Response(client.Response):
                                        auth=base_client._auth)
         proxy_client.schema()
 
-        model = proxy_client._model_gen(resource_name)
+        relation = (proxy_client._model_gen(resource_name), schema['related_type'],)
 
-        # set manager alias
-        if name is not resource_name:
-            setattr(self.model, resource_name, getattr(self.model, name))
+        # the schema is left empty if it couldn't be fetched, try again next time
+        if relation[0]._schema_store:
+            ProxyClient._relations[key] = relation
 
-        if schema['related_type'] == 'to_many':
-            resource_uris = [resource_uri['resource_uri'] if isinstance(resource_uri, dict) else resource_uri for resource_uri in self._response[name]]
-            return ManyToManyManager(
-                       model=model,
-                       instance=self.model,
-                       field_name=name,
-                       query={'id__in': [client.parse_id(resource_uri) for resource_uri in resource_uris]})
+        return relation
 
-        elif schema['related_type'] == 'to_one':
-            return Response(model=model, url=self._response[name])
+    @property
+    def _deferred(self):
+        """
+        Whether the object is referred by the url and not loaded yet.
+        """
+        return (self.__dict__.get('_url') is not None and
+                not self.__dict__.get('_Response__response'))
 
     @property
     def _response(self):
         if self.__response:
             return self.__response
 
-        serializer = slumber.serialize.Serializer(default=self.model._main_client._store['format'])
-
-        if self._url is not None:
-            logger.debug(logf({
-                'message': 'Getting cache...',
-                'key': self._url,
-            }))
-
-            cached = cache.get(self._url)
-            if cached:
-                logger.debug(logf({
-                    'message': 'Found in cache.',
-                    'key': self._url,
-                    'value': cached,
-                }))
+        if (self._url is not None and
+            self._url in get_pending_responses().get(self.model._endpoint, {})):
+            load_pending_responses(self.model)
 
-                self.refresh(serializer.loads(cached))
+            if self.__response:
                 return self.__response
 
-        response = super(Response, self)._response
-
-        if self._url is not None:
-            if 'model' in response:
-                del(response['model'])
+        if self._url is None:
+            return super(Response, self)._response
 
-            content = serializer.dumps(response)
+        options = get_options(self.model)
 
-            logger.debug(logf({
-                'message': 'Setting cache...',
-                'key': self._url,
-                'value': content,
-            }))
+        self.refresh(get_or_fetch(self._url, get_proxy_cache(options), options,
+                                  cache_response, self.model, self._url,
+                                  loads=get_codec(options).loads))
+        return self.__response
 
-            cache.set(self._url, content)
+    def save(self):
+        # make sure the object is loaded
+        self._response
+        super(Response, self).save()
 
-        return response
+    def delete(self):
+        # make sure the object is loaded
+        self._response
+        super(Response, self).delete()
 
     def refresh(self, data):
+        self._related_objects.clear()
         self.__response = data
         try:
             self.model = self.model(**self.__response)
@@ -305,11 +1588,21 @@ class Manager(client.Manager):
         return QuerySet(self.model,
                         response_class=Response)
 
+    def iterator(self, *args, **kwargs):
+        return self.get_query_set().iterator(*args, **kwargs)
+
+    def prefetch_related(self, *fields):
+        return self.get_query_set().prefetch_related(*fields)
+
+    def select_related(self, *fields):
+        return self.get_query_set().select_related(*fields)
+
 
 class ManyToManyManager(client.ManyToManyManager):
 
-    def __init__(self, query=None, instance=None, field_name=None, **kwargs): 
+    def __init__(self, query=None, instance=None, field_name=None, prefetched=None, **kwargs): 
         self._field_name = field_name
+        self._prefetched = prefetched
         super(ManyToManyManager, self).__init__(query, instance, **kwargs)
 
         # FIXME: work around a bug on handling empty to_many manager
@@ -317,20 +1610,53 @@ class ManyToManyManager(client.ManyToManyManager):
         if 'id__in' in self._query and len(self._query['id__in']) < 1:
             self._query.update({'id__in': 0})
 
-    def get_query_set(self):
+    def _prefetched_query_set(self, objects):
         return QuerySet(self.model,
+                        responses={
+                            'meta': {
+                                'limit': len(objects),
+                                'next': None,
+                                'offset': 0,
+                                'previous': None,
+                                'total_count': len(objects),
+                            },
+                            'objects': list(objects),
+                        },
                         query=self._query,
-                        response_class=Response).filter()
+                        response_class=Response)
+
+    def get_query_set(self):
+        if self._prefetched is not None:
+            return self._prefetched_query_set(self._prefetched)
+
+        # evaluated on iteration, len or indexing together with filters
+        return QuerySet(self.model,
+                        query=dict(self._query),
+                        response_class=Response)
 
     def filter(self, *args, **kwargs):
         if 'id__in' in kwargs:
             raise exceptions.ProxyException(_('"id__in" is not supported '
                                               'in ManyToManyManager.'))
-        return QuerySet(self.model,
-                        query=self._query,
-                        response_class=Response).filter(*args, **kwargs)
+
+        if self._prefetched is not None and not args:
+            objects = filter_responses(self.model, self._prefetched, **kwargs)
+            if objects is not None:
+                return self._prefetched_query_set(objects)
+
+        return self.get_query_set().filter(*args, **kwargs)
+
+    def add(self, *objs):
+        self._prefetched = None
+        super(ManyToManyManager, self).add(*objs)
+
+    def remove(self, *objs):
+        self._prefetched = None
+        super(ManyToManyManager, self).remove(*objs)
 
     def clear(self):
+        self._prefetched = None
+
         # work around a bug in tastypie_queryset_client
         self._query.update({"id__in": list(set([]))})
         setattr(self._instance, self._field_name, list(set([])))
@@ -339,8 +1665,10 @@ class ManyToManyManager(client.ManyToManyManager):
 class ProxyClient(client.Client):
 
     _clients = {}
+    _modules = {}
     _proxies = {}
     _models = {}
+    _relations = {}
     _schemas = {}
 
     def __new__(cls, url, **kwargs):
@@ -350,9 +1678,7 @@ class ProxyClient(client.Client):
             cls._clients[key] = super(ProxyClient,
                                       cls).__new__(cls)
 
-        proxy = kwargs.get('proxy')
-        if proxy:
-            cls._proxies[proxy.__class__.__name__.replace('Proxy', '').lower()] = proxy
+        cls.register_proxy(kwargs.get('proxy'))
 
         return cls._clients[key]
 
@@ -402,19 +1728,28 @@ class ProxyClient(client.Client):
                 return obj._getfield_original(name)
 
         def break_cache(obj):
-            cache.delete(getattr(obj,
+            proxy_cache = get_proxy_cache(get_options(model))
+            proxy_cache.delete(getattr(obj,
                                  'resource_uri',
                                  '%s%s/' % (obj._base_client._api_path,
                                             obj._client._store['base_url'].replace(
                                                 obj._base_client._api_url,
                                                 ''))))
+            bump_generation(model._endpoint, proxy_cache)
 
         def save(obj):
             break_cache(obj)
-            model.save_original(obj)                
+            model.save_original(obj)
+            get_proxy_cache(get_options(model)).set_many(unique_index(model, [obj._fields]))
 
         def delete(obj):
+            index = unique_index(model, [obj._fields])
             break_cache(obj)
+
+            if get_identity_map() is not None:
+                get_identity_map().pop(getattr(obj, 'resource_uri', None), None)
+
+            get_proxy_cache(get_options(model)).delete_many(index.keys())
             try:
                 model.delete_original(obj)
             except KeyError, e:
@@ -444,13 +1779,14 @@ class ProxyClient(client.Client):
                 new_value = value
 
         if value != new_value:
-            logger.debug(logf({
-                'message': 'Converting to python...',
-                'field': name,
-                'type': field_type,
-                'from': value.__repr__(),
-                'to': new_value.__repr__(),
-            }))
+            if is_enabled_for(logger, logging.DEBUG):
+                logger.debug(logf({
+                    'message': 'Converting to python...',
+                    'field': name,
+                    'type': field_type,
+                    'from': value.__repr__(),
+                    'to': new_value.__repr__(),
+                }))
 
         obj._fields[name] = new_value
 
@@ -462,13 +1798,14 @@ class ProxyClient(client.Client):
             new_value = value.isoformat()
 
         if value != new_value:
-            logger.debug(logf({
-                'message': 'Serializing from python...',
-                'field': name,
-                'type': field_type,
-                'from': value.__repr__(),
-                'to': new_value.__repr__()
-            }))
+            if is_enabled_for(logger, logging.DEBUG):
+                logger.debug(logf({
+                    'message': 'Serializing from python...',
+                    'field': name,
+                    'type': field_type,
+                    'from': value.__repr__(),
+                    'to': new_value.__repr__()
+                }))
             return new_value
 
         raise exceptions.ProxyException(_('Raise to call super.'))
@@ -488,15 +1825,20 @@ class ProxyClient(client.Client):
                 self._schema_store[model_name] = self.request(url)
                 ProxyClient._schemas[model_name] = self._schema_store[model_name]
             except Exception, e:
-                logger.debug(logf({
-                    'message': 'Couldn\'t fetch the schema definition for some reason.',
-                    'schema': model_name,
-                }))
+                if is_enabled_for(logger, logging.DEBUG):
+                    logger.debug(logf({
+                        'message': 'Couldn\'t fetch the schema definition for some reason.',
+                        'schema': model_name,
+                    }))
+
+        # try to import namespaced proxies once
+        if self._namespace in ProxyClient._modules:
+            return ProxyClient._schemas.get(model_name, {})
 
-        # try to import namespaced proxies
         try:
             module = '%s.proxies' % self._namespace.replace('/', '.')
             import_module(module)
+            ProxyClient._modules[self._namespace] = module
         except ImportError, e:
             try:
                 # guess top level module from proxy class
@@ -504,71 +1846,94 @@ class ProxyClient(client.Client):
                 module = '%s.%s' % (proxy.__class__.__module__.split('.')[0],
                                     module,)
                 import_module(module)
+                ProxyClient._modules[self._namespace] = module
             except ImportError, e:
-                logger.debug(logf({
-                    'message': 'Proxies module not found, '
-                               'the namespace might not be structured based on '
-                               'actual class path.',
-                    'module': module,
-                }))
+                # no need to try again once proxies are there
+                ProxyClient._modules[self._namespace] = None
+
+                if is_enabled_for(logger, logging.DEBUG):
+                    logger.debug(logf({
+                        'message': 'Proxies module not found, '
+                                   'the namespace might not be structured based on '
+                                   'actual class path.',
+                        'module': module,
+                    }))
 
             except Exception, e:
                 pass
 
         return ProxyClient._schemas.get(model_name, {})
 
-    def request(self, url, method='GET'):
-        nocache = False
+    def get_url_options(self, url):
+        """
+        Returns the proxy options of the resource which the url points to.
+        """
+        name = urlparse(self._url_gen(url)).path.replace(urlparse(self._base_url).path,
+                                                         '', 1).split('/')[0]
 
-        if method != 'GET':
-            logger.debug(logf({
-                'message': 'Deleting cache...',
-                'key': url,
-            }))
+        for key, proxy in ProxyClient._proxies.items():
+            if name and name in (key, proxy._meta.resource_name,):
+                return proxy._meta
 
-            cache.delete(url)
-            nocache = True
-        else:
-            logger.debug(logf({
-                'message': 'Getting cache...',
-                'key': url,
-            }))
+        return ProxyOptions
 
-            result = cache.get(url)
+    def request(self, url, method='GET'):
+        options = self.get_url_options(url)
+        # resource schemas and the namespace schema listing the resources
+        proxy_cache = get_proxy_cache(options,
+                                      urlparse(url).path.endswith('/schema/') or
+                                      self._url_gen(url) == self._base_url)
 
-            if result is not None:
+        if method != 'GET':
+            if is_enabled_for(logger, logging.DEBUG):
                 logger.debug(logf({
-                    'message': 'Found in cache.',
+                    'message': 'Deleting cache...',
                     'key': url,
-                    'value': result,
                 }))
 
-                return result
+            proxy_cache.delete(url)
 
-        # override super to handle HTTP response error
-        client = self._main_client._store
-        url = self._url_gen(url)
-        response = client['session'].request(method, url)
+            return self.fetch(url, method)
 
-        if response.status_code >= 300:
-            raise exceptions.ProxyException('Failed to fetch resource (%s, %s %s)' % (url,
-                                                                                      method,
-                                                                                      response.status_code,))
+        key = request_cache_key(url, proxy_cache)
 
-        serializer = slumber.serialize.Serializer(default=client['format'])
-        result = serializer.loads(response.content)
+        return get_or_fetch(key, proxy_cache, options,
+                            self.cache_request, url, key, proxy_cache, options,
+                            loads=get_codec(options).loads)
+
+    def cache_request(self, url, key, proxy_cache, options):
+        start = time.time()
+        result = self.fetch(url)
+        delta = time.time() - start
 
-        if not nocache:
+        if is_enabled_for(logger, logging.DEBUG):
             logger.debug(logf({
                 'message': 'Setting cache...',
                 'url': url,
                 'value': result,
             }))
 
-            cache.set(url, result)
+        proxy_cache.set(key, cache_entry(options, get_codec(options).dumps(result), delta))
 
         return result
 
+    def fetch(self, url, method='GET'):
+        # override super to handle HTTP response error
+        client = self._main_client._store
+        url = self._url_gen(url)
+        response = client['session'].request(method, url)
+
+        if response.status_code >= 300:
+            exception = exceptions.ProxyException('Failed to fetch resource (%s, %s %s)' % (url,
+                                                                                            method,
+                                                                                            response.status_code,))
+            exception.status_code = response.status_code
+            raise exception
+
+        serializer = slumber.serialize.Serializer(default=client['format'])
+
+        return serializer.loads(response.content)
+
     @property
     def proxies(self):
         if len(self._proxies.keys()) > 0:
@@ -586,9 +1951,18 @@ class ProxyClient(client.Client):
     @classmethod
     def get(cls, url, **kwargs):
         key = cls.build_client_key(url, **kwargs)
-        return cls._clients.get(key,
-                                ProxyClient(url,
-                                            **kwargs))
+
+        if key not in cls._clients:
+            return ProxyClient(url, **kwargs)
+
+        cls.register_proxy(kwargs.get('proxy'))
+
+        return cls._clients[key]
+
+    @classmethod
+    def register_proxy(cls, proxy):
+        if proxy:
+            cls._proxies[proxy.__class__.__name__.replace('Proxy', '').lower()] = proxy
 
     @classmethod
     def get_by_schema(cls, schema):
@@ -621,10 +1995,28 @@ class ProxyOptions(object):
     api_url = get_setting('API_URL', None)
     auth = (get_setting('SUPERUSER_USERNAME', None),
             get_setting('SUPERUSER_PASSWORD', None))
+    batch_loading = get_setting('BATCH_LOADING', False)
+    cache = True
+    cache_alias = get_setting('CACHE_ALIAS', None)
+    cache_codec = get_setting('CACHE_CODEC', 'pickle')
+    cache_compress_threshold = get_setting('CACHE_COMPRESS_THRESHOLD', None)
+    cache_list_objects = get_setting('CACHE_LIST_OBJECTS', True)
+    cache_queries = get_setting('CACHE_QUERIES', False)
+    cache_timeout = get_setting('CACHE_TIMEOUT', None)
     client = ProxyClient
+    early_refresh = get_setting('EARLY_REFRESH', 0)
     model = None
     namespace = get_setting('API_NAMESPACE', None)
+    not_found_timeout = get_setting('NOT_FOUND_TIMEOUT', None)
     resource_name = None
+    schema_cache_alias = get_setting('SCHEMA_CACHE_ALIAS', None)
+    schema_cache_timeout = get_setting('SCHEMA_CACHE_TIMEOUT', None)
+    stampede_lock = get_setting('STAMPEDE_LOCK', False)
+    stampede_lock_timeout = get_setting('STAMPEDE_LOCK_TIMEOUT', 10)
+    stale_if_error = get_setting('STALE_IF_ERROR', False)
+    stale_timeout = get_setting('STALE_TIMEOUT', None)
+    stale_while_revalidate = get_setting('STALE_WHILE_REVALIDATE', False)
+    unique_fields = None
     version = get_setting('API_VERSION', 'v1')
 
     def __new__(cls, meta=None):
@@ -728,10 +2120,11 @@ class Proxy(object):
                                      getattr(self._client,
                                              self._meta.resource_name or class_name.lower(), None))
         except AttributeError, e:
-            logger.debug(logf({
-                'message': 'API seems not to have endpoint for the resource.',
-                'resource': class_name,
-            }))
+            if is_enabled_for(logger, logging.DEBUG):
+                logger.debug(logf({
+                    'message': 'API seems not to have endpoint for the resource.',
+                    'resource': class_name,
+                }))
 
     def __init_proxy__(self):
         pass
@@ -768,6 +2161,9 @@ class Proxy(object):
                     del(dictionary[key])
             return dictionary
         else:
+            # make sure the object is loaded
+            self._response
+
             dictionary = dict()
             for field in self.model._fields:
                 dictionary[field] = getattr(self.model, field)
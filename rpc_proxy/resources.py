@@ -6,7 +6,8 @@ from django.conf import settings
 from tastypie import fields
 from tastypie.resources import ModelResource as TastypieModelResource
 
-from rpc_proxy.utils import logf
+from rpc_proxy.paginator import TOTAL_COUNTS, Paginator
+from rpc_proxy.utils import is_enabled_for, logf
 
 
 ALL_METHODS = ('get', 'post', 'put', 'patch', 'delete',)
@@ -24,14 +25,31 @@ class ModelResource(TastypieModelResource):
 
         super(ModelResource, self).__init__()
 
+        # skip or estimate total_count of lists on large tables
+        total_count = getattr(self._meta, 'total_count', 'exact')
+
+        if total_count not in TOTAL_COUNTS:
+            raise ValueError('Unknown total_count: %s' % total_count)
+
+        if (hasattr(self._meta, 'total_count') and
+            total_count != getattr(self._meta.paginator_class, 'total_count', 'exact')):
+            paginator_class = self._meta.paginator_class
+            if not issubclass(paginator_class, Paginator):
+                paginator_class = Paginator
+
+            self._meta.paginator_class = type(paginator_class.__name__, (paginator_class,), {
+                'total_count': total_count,
+            })
+
     def _handle_500(self, request, exception):
         response = super(ModelResource, self)._handle_500(request, exception)
         self.debug(request, response, logger.exception)
         return response
 
     def debug(self, request, response, log=logger.debug):
-        info = log if log == logger.exception else logger.info
-
+        # the summary and the payloads are sampled as separate records,
+        # exceptions are always logged
+        exception = log == logger.exception
         data = {
             'message': 'API called.',
             'user': request.user,
@@ -41,7 +59,13 @@ class ModelResource(TastypieModelResource):
             'query_string': request.META.get('QUERY_STRING'),
         }
 
-        info(logf(data))
+        if is_enabled_for(logger, logging.ERROR if exception else logging.INFO):
+            (log if exception else logger.info)(logf(data))
+
+        if not is_enabled_for(logger, logging.ERROR if exception else logging.DEBUG):
+            return
+
+        data = data.copy()
 
         if len(request.raw_post_data):
             data['post_data'] = request.raw_post_data.decode('utf-8')
@@ -76,10 +100,11 @@ class ModelResource(TastypieModelResource):
         # allow superuser all operations dynamically
         if request.user.is_superuser:
 
-            logger.debug(logf({
-                'message': 'Hello superuser you can do anything with this resource.',
-                'resource': request.META['PATH_INFO'],
-            }))
+            if is_enabled_for(logger, logging.DEBUG):
+                logger.debug(logf({
+                    'message': 'Hello superuser you can do anything with this resource.',
+                    'resource': request.META['PATH_INFO'],
+                }))
 
             self._meta.list_allowed_methods = ALL_METHODS
             self._meta.detail_allowed_methods = ALL_METHODS
@@ -13,7 +13,7 @@ from functools import wraps
 from mock import patch
 from tastypie.test import ResourceTestCase, TestApiClient 
 
-from rpc_proxy.proxies import get_setting
+from rpc_proxy.proxies import cache, get_setting
 
 
 INITIAL_DATA = ('initial_data',)
@@ -72,6 +72,42 @@ def mock_api(func, **decorator_kwargs):
     return wrapper
 
 
+class _AssertNumRequestsContext(object):
+
+    def __init__(self, test_case, num):
+        self.test_case = test_case
+        self.num = num
+
+    def __enter__(self):
+        self.requests = []
+
+        if not get_setting('API_URL', None):
+            return self
+
+        def request(obj, method, url, **kwargs):
+            self.requests.append('%s %s' % (method, url,))
+            return mock_request(obj, method, url, **kwargs)
+
+        self.patcher = patch('requests.sessions.Session.request', request)
+        self.patcher.start()
+
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if not get_setting('API_URL', None):
+            return
+
+        self.patcher.stop()
+
+        if exc_type is not None:
+            return
+
+        self.test_case.assertEqual(len(self.requests), self.num,
+                                   '%d requests were made, %d expected: %s' % (len(self.requests),
+                                                                                self.num,
+                                                                                ', '.join(self.requests),))
+
+
 class TestCase(FastFixtureTestCase):
     """
     Don't be smart in test cases!
@@ -94,9 +130,27 @@ class TestCase(FastFixtureTestCase):
         return testcase
 
     def setUp(self):
+        # objects cached by the process in previous tests, the shared
+        # backend is left to projects to flush
+        if cache.local is not None:
+            cache.local.clear()
+
         call_command('loaddata', *TEST_DATA)
         super(TestCase, self).setUp()
 
+    def assertNumRequests(self, num, func=None, *args, **kwargs):
+        """
+        Asserts the number of API requests like ``assertNumQueries``, does
+        nothing in local model context.
+        """
+        context = _AssertNumRequestsContext(self, num)
+
+        if func is None:
+            return context
+
+        with context:
+            func(*args, **kwargs)
+
 
 class Proxy(TestCase):
     """
@@ -1,10 +1,58 @@
 # -*- coding: utf-8 -*-
+import logging
+import random
 
-def logf(data):
+
+LOG_MAX_LENGTH = 1000
+
+_sampling_rates = {}
+
+
+def logf(data, max_length=LOG_MAX_LENGTH):
     sequence = []
     if isinstance(data, dict):
-        sequence = ['%s="%s"' % (key, value,) for key, value in data.iteritems()]
+        sequence = ['%s="%s"' % (key, truncate(value, max_length),) for key, value in data.iteritems()]
     else:
-        sequence = [data]
+        sequence = [truncate(data, max_length)]
 
     return ' '.join(sequence)
+
+def truncate(value, max_length=None):
+    """
+    Returns the value as a string, which is truncated if it's longer than
+    max_length.
+    """
+    if not isinstance(value, basestring):
+        value = '%s' % (value,)
+
+    if max_length is not None and len(value) > max_length:
+        value = '%s...(%d more)' % (value[:max_length], len(value) - max_length,)
+
+    return value
+
+def set_sampling_rate(name, rate):
+    """
+    Emits DEBUG and INFO records of the logger at the rate between 0 and 1,
+    which are checked by ``is_enabled_for``.
+    """
+    if rate is None:
+        _sampling_rates.pop(name, None)
+    else:
+        _sampling_rates[name] = rate
+
+def is_enabled_for(logger, level):
+    """
+    Returns True if the record of the level is to be emitted by the logger,
+    guards building log data on hot paths. Records above INFO are never
+    sampled out.
+    """
+    if not logger.isEnabledFor(level):
+        return False
+
+    if level > logging.INFO:
+        return True
+
+    rate = _sampling_rates.get(logger.name)
+
+    return rate is None or random.random() < rate
+